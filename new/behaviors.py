@@ -1,156 +1,330 @@
 from __future__ import annotations
-from random import uniform
-from time import perf_counter
 from typing import Any, Callable, Union
 
 import misbehave
 import ppb
 
+import clocks
 import enemies
-import players
+import horde
+from compiler import Compiler
 
 
 class GlobalDebounce(misbehave.decorator.Decorator):
     """
     Debounces for all objects using the same tree.
 
-    Replaces need for global blackboard.
+    Replaces need for global blackboard. The cooldown is a scene timer
+    keyed by the node.
     """
-    last_call = 0
 
     def __init__(self, child, cooldown=.5):
         super().__init__(child, cooldown=cooldown)
         self.cooldown = cooldown
 
     def __call__(self, actor: enemies.Zombie, context: enemies.Context):
-        now = perf_counter()
-        if now >= self.last_call + self.cooldown:
+        timers = context.event.scene.timers
+        if timers.ready(self):
             result = super().__call__(actor, context)
             if result == misbehave.State.SUCCESS:
-                self.last_call = now
+                timers.arm(self, self.cooldown)
             return result
         return misbehave.State.FAILED
 
+    def compile(self, compiler: Compiler):
+        child = compiler.compile(self.child)
+        node = self
+        cooldown = self.cooldown
+
+        def global_debounce(actor, blackboard, context):
+            timers = context.event.scene.timers
+            if timers.ready(node):
+                result = child(actor, blackboard, context)
+                if result == misbehave.State.SUCCESS:
+                    timers.arm(node, cooldown)
+                return result
+            return misbehave.State.FAILED
+        return global_debounce
+
 
 def signal_cry(actor: enemies.Zombie, context: enemies.Context) -> misbehave.State:
-    context.signal(enemies.Cry(actor))
+    context.event.scene.alerts.stamp(actor.position, actor.chase_target)
     return misbehave.State.SUCCESS
 
 
 def add_debug_object(actor: ppb.Sprite, context: enemies.Context) -> misbehave.State:
-    context.event.scene.add(enemies.CryDebug(position=actor.position))
+    context.event.scene.add(enemies.CryDebug(position=actor.position, start=context.event.scene.clock.now))
     return misbehave.State.SUCCESS
 
 
-def compare_heat(child):
+class CompareHeat(misbehave.decorator.Decorator):
 
-    def compare_heat_inner(actor: enemies.Zombie, context: Any) -> misbehave.State:
+    def __call__(self, actor: enemies.Zombie, context: Any) -> misbehave.State:
         if actor.heat >= actor.max_heat:
-            return child(actor, context)
+            return self.child(actor, context)
         return misbehave.State.FAILED
-    return compare_heat_inner
 
+    def compile(self, compiler: Compiler):
+        child = compiler.compile(self.child)
 
-def move_in_fixed_direction(direction: ppb.Vector, time: Union[int, float] = 1) -> Callable[[enemies.Zombie, Any], misbehave.State]:
+        def compare_heat(actor, blackboard, context):
+            if actor.heat >= actor.max_heat:
+                return child(actor, blackboard, context)
+            return misbehave.State.FAILED
+        return compare_heat
 
-    def move_in_fixed_direction_inner(actor: enemies.Zombie, context: Any) -> misbehave.State:  # Context event, signal ???
-        attribute = f"{move_in_fixed_direction_inner.__name__}_{id(move_in_fixed_direction_inner)}"
-        if not getattr(actor, attribute, None):
-            setattr(actor, attribute, perf_counter())
-        actor.position += direction * actor.speed * context.event.time_delta
-        if perf_counter() - getattr(actor, attribute) >= time:
-            setattr(actor, attribute, None)
-            return misbehave.State.SUCCESS
-        return misbehave.State.RUNNING
-    return move_in_fixed_direction_inner
+
+def move_actor(actor, context, direction: ppb.Vector, speed, phase=horde.WANDER):
+    horde_engine = getattr(context.event.scene, "horde", None)
+    if horde_engine is not None and actor in horde_engine:
+        horde_engine.steer(actor, direction, speed, phase, context.time_delta)
+    else:
+        actor.position += direction * speed * context.time_delta
 
 
-def move_to_target(target_attribute: str):
+class MoveInFixedDirection(misbehave.common.BaseNode):
 
-    def move_to_target_inner(actor, context):
-        target_position = getattr(actor, target_attribute)
-        actor.position += (target_position - actor.position).normalize() * actor.speed * context.event.time_delta
+    def __init__(self, direction: ppb.Vector, time: Union[int, float] = 1):
+        self.direction = direction
+        self.time = time
+        self.attribute = f"move_in_fixed_direction_{id(self)}"
+
+    def __call__(self, actor: enemies.Zombie, context: Any) -> misbehave.State:
+        now = context.event.scene.clock.now
+        if not getattr(actor, self.attribute, None):
+            setattr(actor, self.attribute, now)
+        move_actor(actor, context, self.direction, actor.speed)
+        if now - getattr(actor, self.attribute) >= self.time:
+            setattr(actor, self.attribute, None)
+            return misbehave.State.SUCCESS
+        return misbehave.State.RUNNING
+
+    def compile(self, compiler: Compiler):
+        start = compiler.slot(self.attribute)
+        direction = self.direction
+        time = self.time
+
+        def move_in_fixed_direction(actor, blackboard, context):
+            now = context.event.scene.clock.now
+            if not blackboard[start]:
+                blackboard[start] = now
+            move_actor(actor, context, direction, actor.speed)
+            if now - blackboard[start] >= time:
+                blackboard[start] = None
+                return misbehave.State.SUCCESS
+            return misbehave.State.RUNNING
+        return move_in_fixed_direction
+
+
+class MoveToTarget(misbehave.common.BaseNode):
+
+    def __init__(self, target_attribute: str):
+        self.target_attribute = target_attribute
+
+    def __call__(self, actor, context):
+        return self.move(actor, getattr(actor, self.target_attribute), context)
+
+    @staticmethod
+    def move(actor, target_position, context):
+        scene = context.event.scene
+        flow_field = getattr(scene, "flow_field", None)
+        direction = flow_field.toward(actor.position, target_position) if flow_field is not None else None
+        horde_engine = getattr(scene, "horde", None)
+        if horde_engine is not None and actor in horde_engine:
+            if direction is None:
+                horde_engine.seek(actor, target_position, actor.speed, context.time_delta)
+            else:
+                horde_engine.steer(actor, direction, actor.speed, horde.FOLLOW, context.time_delta)
+        else:
+            if direction is None:
+                direction = (target_position - actor.position).normalize()
+            actor.position += direction * actor.speed * context.time_delta
         if (target_position - actor.position).length <= actor.size * 1.5:
             return misbehave.State.SUCCESS
         return misbehave.State.RUNNING
-    return move_to_target_inner
 
+    def compile(self, compiler: Compiler):
+        get_target = compiler.getter(self.target_attribute)
+        move = self.move
+
+        def move_to_target(actor, blackboard, context):
+            return move(actor, get_target(actor, blackboard), context)
+        return move_to_target
 
-def pick_random_direction(storage_attribute):
 
-    def pick_random_direction_inner(actor, context):
-        direction_vector = ppb.Vector(uniform(-1, 1), uniform(-1, 1))
+class PickRandomDirection(misbehave.common.BaseNode):
+
+    def __init__(self, storage_attribute):
+        self.storage_attribute = storage_attribute
+
+    @staticmethod
+    def pick(rng):
+        direction_vector = ppb.Vector(rng.uniform(-1, 1), rng.uniform(-1, 1))
         if direction_vector:
             direction_vector.normalize()
-        setattr(actor, storage_attribute, direction_vector)
+        return direction_vector
+
+    def __call__(self, actor, context):
+        setattr(actor, self.storage_attribute, self.pick(context.event.scene.rng))
         return misbehave.State.SUCCESS
-    return pick_random_direction_inner
 
+    def compile(self, compiler: Compiler):
+        store = compiler.setter(self.storage_attribute)
+        pick = self.pick
+
+        def pick_random_direction(actor, blackboard, context):
+            store(actor, blackboard, pick(context.event.scene.rng))
+            return misbehave.State.SUCCESS
+        return pick_random_direction
 
-def pick_random_value(storage_attribute, min, max):
 
-    def pick_random_value_inner(actor, context):
-        setattr(actor, storage_attribute, uniform(min, max))
+class PickRandomValue(misbehave.common.BaseNode):
+
+    def __init__(self, storage_attribute, min, max):
+        self.storage_attribute = storage_attribute
+        self.min = min
+        self.max = max
+
+    def __call__(self, actor, context):
+        setattr(actor, self.storage_attribute, context.event.scene.rng.uniform(self.min, self.max))
         return misbehave.State.SUCCESS
-    return pick_random_value_inner
 
+    def compile(self, compiler: Compiler):
+        store = compiler.setter(self.storage_attribute)
+        min, max = self.min, self.max
+
+        def pick_random_value(actor, blackboard, context):
+            store(actor, blackboard, context.event.scene.rng.uniform(min, max))
+            return misbehave.State.SUCCESS
+        return pick_random_value
 
-def pick_random_speed(storage_attribute, min, max):
 
-    def pick_random_speed_inner(actor, context):
-        result = uniform(min, max) * actor.speed
+class PickRandomSpeed(PickRandomValue):
+
+    @staticmethod
+    def pick(rng, actor, min, max):
+        result = rng.uniform(min, max) * actor.speed
         if result > actor.speed:
             raise ValueError("Way too fast.")
-        setattr(actor, storage_attribute, result)
+        return result
+
+    def __call__(self, actor, context):
+        setattr(actor, self.storage_attribute, self.pick(context.event.scene.rng, actor, self.min, self.max))
         return misbehave.State.SUCCESS
-    return pick_random_speed_inner
+
+    def compile(self, compiler: Compiler):
+        store = compiler.setter(self.storage_attribute)
+        min, max = self.min, self.max
+        pick = self.pick
+
+        def pick_random_speed(actor, blackboard, context):
+            store(actor, blackboard, pick(context.event.scene.rng, actor, min, max))
+            return misbehave.State.SUCCESS
+        return pick_random_speed
 
 
-def wander(direction_attr, speed_attr, time_attr, start_attr):
+class Wander(misbehave.common.BaseNode):
 
-    def wander_inner(actor, context):
-        start_time = getattr(actor, start_attr)
-        direction = getattr(actor, direction_attr)
-        speed = getattr(actor, speed_attr)
-        time = getattr(actor, time_attr)
-        movement_vector = direction * speed * context.event.time_delta
-        actor.position += movement_vector
-        if perf_counter() - start_time >= time:
+    def __init__(self, direction_attr, speed_attr, time_attr, start_attr, phase=horde.WANDER):
+        self.direction_attr = direction_attr
+        self.speed_attr = speed_attr
+        self.time_attr = time_attr
+        self.start_attr = start_attr
+        self.phase = phase
+
+    def __call__(self, actor, context):
+        start_time = getattr(actor, self.start_attr)
+        direction = getattr(actor, self.direction_attr)
+        speed = getattr(actor, self.speed_attr)
+        time = getattr(actor, self.time_attr)
+        move_actor(actor, context, direction, speed, self.phase)
+        if context.event.scene.clock.now - start_time >= time:
             return misbehave.State.SUCCESS
         return misbehave.State.RUNNING
-    return wander_inner
 
+    def compile(self, compiler: Compiler):
+        get_start = compiler.getter(self.start_attr)
+        get_direction = compiler.getter(self.direction_attr)
+        get_speed = compiler.getter(self.speed_attr)
+        get_time = compiler.getter(self.time_attr)
+        phase = self.phase
+
+        def wander(actor, blackboard, context):
+            start_time = get_start(actor, blackboard)
+            move_actor(actor, context, get_direction(actor, blackboard), get_speed(actor, blackboard), phase)
+            if context.event.scene.clock.now - start_time >= get_time(actor, blackboard):
+                return misbehave.State.SUCCESS
+            return misbehave.State.RUNNING
+        return wander
+
+
+class CheckIfPlayerIsClose(misbehave.decorator.Decorator):
 
-def check_if_player_is_close(child, *, storage_attr):
+    def __init__(self, child, *, storage_attr):
+        super().__init__(child)
+        self.storage_attr = storage_attr
 
-    def check_if_player_is_close_inner(actor, context):
-        player = next(context.event.scene.get(kind=players.Player))
+    def __call__(self, actor, context):
+        if not context.perceive:
+            return misbehave.State.FAILED
+        player = context.event.scene.player
         distance_to_player = (player.position - actor.position).length
-        critical_distance = getattr(actor, storage_attr)
+        critical_distance = getattr(actor, self.storage_attr)
         if distance_to_player <= critical_distance:
-            return child(actor, context)
+            return self.child(actor, context)
         return misbehave.State.FAILED
 
-    return check_if_player_is_close_inner
+    def compile(self, compiler: Compiler):
+        child = compiler.compile(self.child)
+        get_distance = compiler.getter(self.storage_attr)
 
+        def check_if_player_is_close(actor, blackboard, context):
+            if not context.perceive:
+                return misbehave.State.FAILED
+            player = context.event.scene.player
+            if (player.position - actor.position).length <= get_distance(actor, blackboard):
+                return child(actor, blackboard, context)
+            return misbehave.State.FAILED
+        return check_if_player_is_close
 
-def set_player_position_on_actor(storage_attr):
 
-    def set_player_position_inner(actor, context):
-        player = next(context.event.scene.get(kind=players.Player))
-        setattr(actor, storage_attr, player.position)
+class SetPlayerPosition(misbehave.common.BaseNode):
+
+    def __init__(self, storage_attr):
+        self.storage_attr = storage_attr
+
+    def __call__(self, actor, context):
+        setattr(actor, self.storage_attr, context.event.scene.player.position)
         return misbehave.State.SUCCESS
-    return set_player_position_inner
+
+    def compile(self, compiler: Compiler):
+        store = compiler.setter(self.storage_attr)
+
+        def set_player_position(actor, blackboard, context):
+            store(actor, blackboard, context.event.scene.player.position)
+            return misbehave.State.SUCCESS
+        return set_player_position
 
 
-def set_attack_direction(target_attr, storage_attr):
+class SetAttackDirection(misbehave.common.BaseNode):
 
-    def set_attack_direction_inner(actor, context):
-        target = getattr(actor, target_attr)
-        direction_vector = (target - actor.position).normalize()
-        setattr(actor, storage_attr, direction_vector)
+    def __init__(self, target_attr, storage_attr):
+        self.target_attr = target_attr
+        self.storage_attr = storage_attr
+
+    def __call__(self, actor, context):
+        target = getattr(actor, self.target_attr)
+        setattr(actor, self.storage_attr, (target - actor.position).normalize())
         return misbehave.State.SUCCESS
-    return set_attack_direction_inner
+
+    def compile(self, compiler: Compiler):
+        get_target = compiler.getter(self.target_attr)
+        store = compiler.setter(self.storage_attr)
+
+        def set_attack_direction(actor, blackboard, context):
+            store(actor, blackboard, (get_target(actor, blackboard) - actor.position).normalize())
+            return misbehave.State.SUCCESS
+        return set_attack_direction
 
 
 def kill_actor(actor, context):
@@ -160,21 +334,21 @@ def kill_actor(actor, context):
 
 def octogon(magnitude=0.5):
     return misbehave.selector.Sequence(
-        move_in_fixed_direction(ppb.directions.Up, magnitude),
-        move_in_fixed_direction(ppb.directions.UpAndLeft, magnitude),
-        move_in_fixed_direction(ppb.directions.Left, magnitude),
-        move_in_fixed_direction(ppb.directions.DownAndLeft, magnitude),
-        move_in_fixed_direction(ppb.directions.Down, magnitude),
-        move_in_fixed_direction(ppb.directions.DownAndRight, magnitude),
-        move_in_fixed_direction(ppb.directions.Right, magnitude),
-        move_in_fixed_direction(ppb.directions.UpAndRight, magnitude)
+        MoveInFixedDirection(ppb.directions.Up, magnitude),
+        MoveInFixedDirection(ppb.directions.UpAndLeft, magnitude),
+        MoveInFixedDirection(ppb.directions.Left, magnitude),
+        MoveInFixedDirection(ppb.directions.DownAndLeft, magnitude),
+        MoveInFixedDirection(ppb.directions.Down, magnitude),
+        MoveInFixedDirection(ppb.directions.DownAndRight, magnitude),
+        MoveInFixedDirection(ppb.directions.Right, magnitude),
+        MoveInFixedDirection(ppb.directions.UpAndRight, magnitude)
     )
 
 
 chase_tree = misbehave.selector.Concurrent(
     misbehave.selector.Sequence(
         misbehave.action.CheckValue("chase_target"),
-        move_to_target("chase_target"),
+        MoveToTarget("chase_target"),
         misbehave.action.SetValue("chase_target", None),
     ),
     GlobalDebounce(
@@ -188,42 +362,44 @@ chase_tree = misbehave.selector.Concurrent(
 )
 
 wander_tree = misbehave.selector.Sequence(
-    pick_random_direction("wander_direction"),
-    pick_random_speed("wander_speed", .25, .75),
-    pick_random_value("wander_time", .25, 1.5),
-    misbehave.action.SetCurrentTime("wander_start"),
-    wander("wander_direction", "wander_speed", "wander_time", "wander_start")
+    PickRandomDirection("wander_direction"),
+    PickRandomSpeed("wander_speed", .25, .75),
+    PickRandomValue("wander_time", .25, 1.5),
+    misbehave.action.SetCurrentTime("wander_start", clocks.now),
+    Wander("wander_direction", "wander_speed", "wander_time", "wander_start")
 )
 
 lunge_tree = misbehave.selector.Sequence(
-    check_if_player_is_close(
-        set_player_position_on_actor("attack_target"),
+    CheckIfPlayerIsClose(
+        SetPlayerPosition("attack_target"),
         storage_attr="attack_range"
     ),
-    set_attack_direction("attack_target", "attack_direction"),
-    misbehave.action.SetCurrentTime("wind_up"),
-    misbehave.action.Wait("wind_up", 0.1),
-    misbehave.action.SetCurrentTime("attack_start"),
-    wander(
+    SetAttackDirection("attack_target", "attack_direction"),
+    misbehave.action.SetCurrentTime("wind_up", clocks.now),
+    misbehave.action.Wait("wind_up", 0.1, clocks.now),
+    misbehave.action.SetCurrentTime("attack_start", clocks.now),
+    Wander(
         "attack_direction",
         "attack_speed",
         "attack_time",
-        "attack_start"
+        "attack_start",
+        phase=horde.LUNGE
     )
 )
 
-on_fire_tree = compare_heat(
+on_fire_tree = CompareHeat(
     misbehave.selector.Sequence(
-        pick_random_direction("flee_direction"),
-        misbehave.action.SetCurrentTime("flee_start"),
-        wander(
+        PickRandomDirection("flee_direction"),
+        misbehave.action.SetCurrentTime("flee_start", clocks.now),
+        Wander(
             "flee_direction",
             "flee_speed",
             "flee_time",
-            "flee_start"
+            "flee_start",
+            phase=horde.FLEE
         ),
-        misbehave.action.SetCurrentTime('death_wait'),
-        misbehave.action.Wait('death_wait', 0.25),
+        misbehave.action.SetCurrentTime('death_wait', clocks.now),
+        misbehave.action.Wait('death_wait', 0.25, clocks.now),
         kill_actor
     )
 )
@@ -233,8 +409,8 @@ zombie_base_tree = misbehave.selector.Priority(
     lunge_tree,
     misbehave.selector.Concurrent(
         chase_tree,
-        check_if_player_is_close(
-            set_player_position_on_actor("chase_target"),
+        CheckIfPlayerIsClose(
+            SetPlayerPosition("chase_target"),
             storage_attr="awareness"
         ),
         num_fail=2
@@ -0,0 +1,159 @@
+"""
+Microbenchmarks for the simulation hot paths.
+
+Every benchmark is timed at several entity counts and printed as one JSON
+object per line, so runs can be diffed and plotted as scaling curves:
+
+    python bench.py --counts 10 100 1000 10000 > bench_output.txt
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+import random
+import sys
+from statistics import mean
+from time import perf_counter
+from typing import Callable, Dict
+
+import ppb
+from ppb.camera import Camera
+
+import config
+import enemies
+import levels
+import players
+import scenes
+import systems
+
+Benchmark = Callable[[int], Callable[[], object]]
+
+SPAWN_LEVEL = 10
+
+BENCHMARKS: Dict[str, Benchmark] = {}
+
+
+def benchmark(function: Benchmark) -> Benchmark:
+    """
+    Register a benchmark. It receives the entity count, does its setup and
+    returns the callable to time. A callable that returns an int reports
+    how many entities it actually handled.
+    """
+    BENCHMARKS[function.__name__] = function
+    return function
+
+
+def ignore_signal(event, *, targets=None):
+    pass
+
+
+def build_game(level=1) -> scenes.Game:
+    game = scenes.Game(level=level)
+    game.main_camera = Camera(None, config.Game.main_camera_width, config.Headless.resolution)
+    return game
+
+
+def scatter(game, count, kind, **kwargs):
+    top, right, bottom, left = game.play_space_limits
+    for _ in range(count):
+        position = ppb.Vector(random.uniform(left, right), random.uniform(bottom, top))
+        game.add(kind(position=position, **kwargs))
+
+
+def level_for(count):
+    # Play space grows with level, keep the density roughly constant.
+    return max(1, int(count ** 0.5) // 3)
+
+
+@benchmark
+def collider_on_idle(count):
+    game = build_game(level_for(count))
+    scatter(game, count, enemies.Zombie)
+    scatter(game, count // 4, players.Bullet, direction=ppb.directions.Up)
+    collider = next(game.get(kind=scenes.Collider))
+    collider.primed = True
+    event = ppb.events.Idle(0.016, scene=game)
+    return lambda: collider.on_idle(event, ignore_signal)
+
+
+@benchmark
+def zombie_tree_tick(count):
+    game = build_game(level_for(count))
+    scatter(game, count, enemies.Zombie)
+    brains = systems.EnemyBrains()
+    event = ppb.events.Update(0.016, scene=game)
+    return lambda: brains.on_update(event, ignore_signal)
+
+
+@benchmark
+def zombie_spawn(count):
+    # Spawn groups on one level until count zombies made it past the checks.
+    game = build_game(SPAWN_LEVEL)
+    game.player.position = ppb.Vector(0, 0)
+
+    def spawn():
+        start = game.spawned
+        while game.spawned - start < count:
+            enemies.Zombie.spawn(game)
+        return game.spawned - start
+    return spawn
+
+
+@benchmark
+def generate_level(count):
+    # Roughly nine walls per level between the border and the scattered ones.
+    level = max(1, count // 9)
+    return lambda: levels.build(level)
+
+
+@benchmark
+def flow_field_search(count):
+    # The pass only covers flow_radius around the goal, whatever the level.
+    field = levels.build(level_for(count)).flow_field
+    field.update(ppb.Vector(0.5, 0.5))
+    return field.search
+
+
+@benchmark
+def bullet_update(count):
+    game = build_game(level_for(count))
+    scatter(game, count, players.Bullet, direction=ppb.directions.Up, max_distance=float("inf"))
+    return lambda: game.projectiles.step(0.016)
+
+
+def measure(name, count, repeat):
+    timings = []
+    handled = []
+    for attempt in range(repeat):
+        random.seed(attempt)
+        run = BENCHMARKS[name](count)
+        start = perf_counter()
+        result = run()
+        timings.append(perf_counter() - start)
+        handled.append(result if isinstance(result, int) else count)
+    return {
+        "benchmark": name,
+        "entities": count,
+        "repeat": repeat,
+        "mean_s": mean(timings),
+        "min_s": min(timings),
+        "per_entity_us": min(timing / entities for timing, entities in zip(timings, handled)) * 1e6,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the simulation hot paths at increasing entity counts.")
+    parser.add_argument("--counts", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), default=sorted(BENCHMARKS))
+    args = parser.parse_args(argv)
+
+    for name in args.only:
+        for count in args.counts:
+            print(json.dumps(measure(name, count, args.repeat)), file=sys.stdout, flush=True)
+
+
+if __name__ == "__main__":
+    main()
+    # Asset loading never starts here, so its waiter threads never finish.
+    os._exit(0)
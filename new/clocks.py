@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import config
+
+
+class SimulationClock:
+    """
+    Scene time in seconds, moved only by published Updates.
+
+    time_scale below 1 shrinks every update, above 1 the SimulationTime
+    system runs extra fixed steps, so fast-forward never changes the size
+    of a step.
+    """
+
+    def __init__(self, time_scale=config.Clock.time_scale):
+        self.now = 0
+        self.time_scale = time_scale
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, time_delta):
+        self.now += time_delta
+
+
+def now() -> float:
+    """
+    Timer for misbehave nodes in enemy trees.
+
+    It only marks the node: compiled trees read the clock of the scene
+    they are ticked in from the context instead of calling it.
+    """
+    raise RuntimeError("clocks.now is read from the context by compiled trees.")
@@ -0,0 +1,291 @@
+from __future__ import annotations
+from typing import Any, Callable, Optional
+
+import misbehave
+from misbehave import action, decorator, selector
+
+import clocks
+
+State = misbehave.State
+CompiledNode = Callable[[Any, list, Any], State]
+Reset = Callable[[Any, list], None]
+
+
+class Executor:
+    """
+    A compiled behavior tree.
+
+    Tree private state lives in a list blackboard on the actor, the nodes
+    were bound to its indices at compile time.
+    """
+
+    def __init__(self, root: CompiledNode, slots: dict, defaults: list):
+        self.root = root
+        self.slots = slots
+        self.defaults = defaults
+
+    def new_blackboard(self) -> list:
+        return list(self.defaults)
+
+    def __call__(self, actor, context) -> State:
+        blackboard = actor.blackboard
+        if blackboard is None:
+            blackboard = actor.blackboard = self.new_blackboard()
+        return self.root(actor, blackboard, context)
+
+
+class Compiler:
+    """
+    Turns a misbehave tree into functions of (actor, blackboard, context).
+
+    Names the actor kind already defines (chase_target, awareness, speed)
+    stay on the actor, every other name gets a blackboard slot. Custom nodes
+    take part by defining compile(compiler), anything unknown is called as is.
+    """
+
+    def __init__(self, actor_kind: type):
+        self.actor_kind = actor_kind
+        self.slots = {}
+        self.defaults = []
+        self.parents = []
+        self.exclusive = True
+
+    def slot(self, name, default=None) -> int:
+        if name not in self.slots:
+            self.slots[name] = len(self.defaults)
+            self.defaults.append(default)
+        return self.slots[name]
+
+    def on_actor(self, name) -> bool:
+        return hasattr(self.actor_kind, name)
+
+    def getter(self, name, default=None) -> Callable[[Any, list], Any]:
+        if self.on_actor(name):
+            return lambda actor, blackboard: getattr(actor, name, default)
+        index = self.slot(name, default)
+        return lambda actor, blackboard: blackboard[index]
+
+    def setter(self, name) -> Callable[[Any, list, Any], None]:
+        if self.on_actor(name):
+            return lambda actor, blackboard, value: setattr(actor, name, value)
+        index = self.slot(name)
+
+        def store(actor, blackboard, value):
+            blackboard[index] = value
+        return store
+
+    def compile(self, node) -> CompiledNode:
+        # A node is exclusive when every ancestor resumes at its running
+        # child, so while it runs nothing else in the tree is evaluated.
+        self.exclusive = all(type(parent) in RESUMING for parent in self.parents)
+        self.parents.append(node)
+        try:
+            compile_node = getattr(node, "compile", None)
+            if compile_node is not None:
+                return compile_node(self)
+            builder = BUILDERS.get(type(node))
+            if builder is not None:
+                return builder(node, self)
+        finally:
+            self.parents.pop()
+
+        def opaque(actor, blackboard, context):
+            return node(actor, context)
+        return opaque
+
+    def resetter(self, node) -> Optional[Reset]:
+        """
+        The compiled equivalent of node.reset, None when it does nothing.
+        """
+        if isinstance(node, selector.BaseSelector):
+            resets = [reset for reset in map(self.resetter, node.children) if reset is not None]
+            index = self.slot(node.continue_attr, 0) if isinstance(node, selector.ContinuableSelector) else None
+            if index is None and not resets:
+                return None
+
+            def reset(actor, blackboard):
+                for child_reset in resets:
+                    child_reset(actor, blackboard)
+                if index is not None:
+                    blackboard[index] = 0
+            return reset
+        if getattr(type(node), "reset", misbehave.BaseNode.reset) is misbehave.BaseNode.reset:
+            return None
+        return lambda actor, blackboard: node.reset(actor)
+
+
+def compile_tree(tree, actor_kind: type) -> Executor:
+    compiler = Compiler(actor_kind)
+    root = compiler.compile(tree)
+    return Executor(root, compiler.slots, compiler.defaults)
+
+
+def _continuable(node: selector.ContinuableSelector, compiler: Compiler) -> CompiledNode:
+    children = [compiler.compile(child) for child in node.children]
+    reset = compiler.resetter(node)
+    index = compiler.slot(node.continue_attr, 0)
+    stop_states = frozenset(node.stop_states)
+    continue_states = frozenset(node.continue_states)
+    final_state = node.final_state
+    count = len(children)
+
+    def continuable(actor, blackboard, context):
+        new_state = final_state
+        i = 0
+        for i in range(blackboard[index], count):
+            result = children[i](actor, blackboard, context)
+            if result in stop_states:
+                new_state = result
+                break
+        if new_state in continue_states:
+            blackboard[index] = i
+        else:
+            reset(actor, blackboard)
+        return new_state
+    return continuable
+
+
+def _concurrent(node: selector.Concurrent, compiler: Compiler) -> CompiledNode:
+    children = [compiler.compile(child) for child in node.children]
+    num_fail = node.num_fail
+    count = len(children)
+
+    def concurrent(actor, blackboard, context):
+        failed = 0
+        succeeded = 0
+        for child in children:
+            state = child(actor, blackboard, context)
+            if state is State.FAILED:
+                failed += 1
+            elif state == State.SUCCESS:
+                succeeded += 1
+            if failed >= num_fail:
+                return State.FAILED
+        if succeeded == count:
+            return State.SUCCESS
+        return State.RUNNING
+    return concurrent
+
+
+def _decorator(node: decorator.Decorator, compiler: Compiler) -> CompiledNode:
+    return compiler.compile(node.child)
+
+
+def _inverter(node: decorator.Inverter, compiler: Compiler) -> CompiledNode:
+    child = compiler.compile(node.child)
+
+    def inverter(actor, blackboard, context):
+        result = child(actor, blackboard, context)
+        if result is State.SUCCESS:
+            return State.FAILED
+        elif result is State.FAILED:
+            return State.SUCCESS
+        return result
+    return inverter
+
+
+def _timer(node) -> Callable[[Any], float]:
+    """
+    The node's timer as a function of the context. clocks.now stands for the
+    clock of the scene the tree is ticked in.
+    """
+    timer = node.timer
+    if timer is clocks.now:
+        return lambda context: context.event.scene.clock.now
+    return lambda context: timer()
+
+
+def _debounce(node: decorator.Debounce, compiler: Compiler) -> CompiledNode:
+    child = compiler.compile(node.child)
+    index = compiler.slot(node.attr, -10)
+    timer = _timer(node)
+    cool_down = node.cool_down
+
+    def debounce(actor, blackboard, context):
+        if timer(context) <= blackboard[index] + cool_down:
+            return State.FAILED
+        result = child(actor, blackboard, context)
+        if result is State.SUCCESS:
+            blackboard[index] = timer(context)
+        return result
+    return debounce
+
+
+def _check_value(node: action.CheckValue, compiler: Compiler) -> CompiledNode:
+    get = compiler.getter(node.attribute_name)
+
+    def check_value(actor, blackboard, context):
+        if get(actor, blackboard):
+            return State.SUCCESS
+        return State.FAILED
+    return check_value
+
+
+def _set_value(node: action.SetValue, compiler: Compiler) -> CompiledNode:
+    store = compiler.setter(node.attribute_name)
+    value = node.value
+
+    def set_value(actor, blackboard, context):
+        store(actor, blackboard, value)
+        return State.SUCCESS
+    return set_value
+
+
+def _set_current_time(node: action.SetCurrentTime, compiler: Compiler) -> CompiledNode:
+    store = compiler.setter(node.attribute_name)
+    timer = _timer(node)
+
+    def set_current_time(actor, blackboard, context):
+        store(actor, blackboard, timer(context))
+        return State.SUCCESS
+    return set_current_time
+
+
+def _wait(node: action.Wait, compiler: Compiler) -> CompiledNode:
+    exclusive = compiler.exclusive
+    get = compiler.getter(node.attribute_name)
+    timer = _timer(node)
+    wait_time = node.wait_time
+
+    def wait(actor, blackboard, context):
+        wake_at = get(actor, blackboard) + wait_time
+        if timer(context) >= wake_at:
+            return State.SUCCESS
+        if exclusive:
+            # Nothing else runs until this wait is over, the tree can sleep.
+            context.wake_at = wake_at
+        return State.RUNNING
+    return wait
+
+
+def _idle(node: action.Idle, compiler: Compiler) -> CompiledNode:
+    return lambda actor, blackboard, context: State.RUNNING
+
+
+def _increase_value(node: action.IncreaseValue, compiler: Compiler) -> CompiledNode:
+    get = compiler.getter(node.attribute_name)
+    store = compiler.setter(node.attribute_name)
+    value = node.value
+
+    def increase_value(actor, blackboard, context):
+        store(actor, blackboard, get(actor, blackboard) + value)
+        return State.SUCCESS
+    return increase_value
+
+
+RESUMING = (selector.Priority, selector.Sequence)
+
+BUILDERS = {
+    selector.Priority: _continuable,
+    selector.Sequence: _continuable,
+    selector.Concurrent: _concurrent,
+    decorator.Inverter: _inverter,
+    decorator.Debounce: _debounce,
+    decorator.Decorator: _decorator,
+    action.CheckValue: _check_value,
+    action.SetValue: _set_value,
+    action.SetCurrentTime: _set_current_time,
+    action.Wait: _wait,
+    action.Idle: _idle,
+    action.IncreaseValue: _increase_value,
+}
@@ -2,13 +2,36 @@ class Root:
     base_speed = 5
 
 
+class Alert:
+    cell_size = 4
+    radius = 12
+    lifetime = 1.5
+
+
 class Bullet:
     size = 0.5
     speed_modifier = 3
+    initial_capacity = 64
+
+
+class Clock:
+    time_scale = 1
+    time_step = 0.016
+    max_steps = 100
 
 
 class Collider:
     wall_push = 0.25
+    cell_size = 2
+    map_cell_size = 1
+    listener_margin = 1
+    wall_size = 2
+    flow_radius = 16
+
+
+class Culling:
+    cell_size = 4
+    margin = 2
 
 
 class Game:
@@ -16,6 +39,7 @@ class Game:
 
     main_camera_width = 50
     main_camera_position_blend = 0.05
+    main_camera_snap = 0.01
 
     spawn_limit_base = 20
     spawn_limit_scalar = 5
@@ -26,14 +50,32 @@ class Game:
     skeleton_spawn_base = 12.0
     skeleton_spawn_initial = 6.0
 
-    wall_spawn_step_count = 3
-
 
 class Fire:
     debounce = 0.1
     heat = 1
 
 
+class Headless:
+    time_delta = 0.016
+    resolution = (800, 600)
+
+
+class Horde:
+    enabled = False  # No measured gain over the sprites moving themselves yet.
+    initial_capacity = 256
+
+
+class LevelOfDetail:
+    margin = 2
+    far_distance = 30
+    far_interval = 4
+
+
+class Pools:
+    limit = 1000
+
+
 class Player:
     life = 10
     max_heat = 10
@@ -48,6 +90,11 @@ class Player:
     reduce_heat_debounce = 0.4
 
 
+class Profiler:
+    history = 600
+    hud_interval = 30
+
+
 class Skeleton:
     attack_range = 3
     awareness = 8
@@ -56,6 +103,27 @@ class Skeleton:
     speed_modifer = 1.2
 
 
+class Stress:
+    zombies = 200
+    skeletons = 20
+    walls = 60
+    hazards = 10
+    fire_rate = 4
+    arena = 40
+    budget_ms = 16
+    ramp = (100, 250, 500, 1000, 2000)
+    ticks = 120
+
+
+class Text:
+    cache_size = 128
+
+
+class Timers:
+    resolution = 0.01
+    slots = 256
+
+
 class Zombie:
     attack_speed_modifier = 2
     attack_time = .35
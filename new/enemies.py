@@ -1,29 +1,26 @@
 from __future__ import annotations
 import math
 from dataclasses import dataclass
-from random import randint, uniform
-from time import perf_counter
 from typing import Any, Callable
 
 import misbehave
 import ppb
 
 import config
-import players as player_module
 import events as game_events
 import behaviors
-import utils
+import compiler
+import horde
+import pools
 
 
 @dataclass
 class Context:
     event: Any
     signal: Any
-
-
-@dataclass
-class Cry:
-    source: Zombie
+    wake_at: float = None
+    time_delta: float = 0  # Seconds since this enemy last ticked.
+    perceive: bool = True  # False skips the player distance checks.
 
 
 class CryDebug(ppb.Sprite):
@@ -31,17 +28,14 @@ class CryDebug(ppb.Sprite):
     size = 12
     life_time = 2
     image = ppb.Circle(200, 200, 100)
-
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        self.start = perf_counter()
+    start = 0
 
     def on_pre_render(self, e: ppb.events.PreRender, signal):
-        if perf_counter() > self.start + self.life_time:
+        if e.scene.clock.now > self.start + self.life_time:
             e.scene.remove(self)
 
 
-class Zombie(ppb.Sprite):
+class Zombie(horde.Member, ppb.Sprite):
     speed_modifer = config.Zombie.speed_modifier
     attack_speed_modifier = config.Zombie.attack_speed_modifier
     attack_time = config.Zombie.attack_time
@@ -51,11 +45,18 @@ class Zombie(ppb.Sprite):
     size = config.Zombie.size
     points = config.Zombie.point_value
     tree: Callable[[Zombie, Any], misbehave.State] = behaviors.zombie_base_tree
+    brain: compiler.Executor = None
+    blackboard: list = None
+    wake_at: float = None
     heat: int = 0
     max_heat: int = config.Zombie.max_heat
     flee_speed_modifier = config.Zombie.flee_speed
     flee_time = config.Zombie.flee_time
     chase_target = None
+    alert_seen = 0  # Number of the last alert stamp followed.
+    lod_elapsed: float = 0
+    lod_phase: int = 0
+    pooled = True
 
     spawn_multiplier = config.Zombie.spawn_multiplier
     min_first_cut = config.Zombie.spawn_first_min
@@ -68,6 +69,10 @@ class Zombie(ppb.Sprite):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.brain = compiler.compile_tree(cls.tree, cls)
+
     @property
     def speed(self):
         return self.speed_modifer * config.Root.base_speed
@@ -80,10 +85,30 @@ class Zombie(ppb.Sprite):
     def flee_speed(self):
         return self.speed * self.flee_speed_modifier
 
-    def on_update(self, event, signal):
-        context = Context(event, signal)
-        self.tree(self, context)
-        self.reduce_heat()
+    def tick(self, context: Context, now):
+        alerts = context.event.scene.alerts
+        if self.chase_target is None and alerts.cells:
+            alert = alerts.sample(self.position, self.alert_seen)
+            if alert is not None:
+                self.alert_seen, self.chase_target = alert
+        if self.wake_at is None or now >= self.wake_at:
+            context.wake_at = None
+            self.brain(self, context)
+            self.wake_at = context.wake_at
+        self.reduce_heat(context.event.scene)
+
+    @classmethod
+    def hearing_range(cls, noise) -> float:
+        """
+        The farthest any kind of enemy can hear a noise from.
+        """
+        kinds = [cls]
+        awareness = 0
+        while kinds:
+            kind = kinds.pop()
+            awareness = max(awareness, kind.awareness)
+            kinds.extend(kind.__subclasses__())
+        return awareness * noise
 
     def on_shot_fired(self, event: game_events.ShotFired, signal):
         if (event.position - self.position).length <= self.awareness * event.noise:
@@ -92,11 +117,12 @@ class Zombie(ppb.Sprite):
     @classmethod
     def spawn(cls, scene):
         top_limit, right_limit, bottom_limit, left_limit = scene.play_space_limits
+        rng = scene.rng
         group_origin = ppb.Vector(
-            uniform(left_limit, right_limit),
-            uniform(top_limit, bottom_limit)
+            rng.uniform(left_limit, right_limit),
+            rng.uniform(top_limit, bottom_limit)
         )
-        player = next(scene.get(kind=player_module.Player))
+        player = scene.player
         if (player.position - group_origin).length <= cls.awareness + 2.5:
             return
         # Minimum  == level,  1/2 round up to fist, then 1/4 and 1/4 round down
@@ -115,26 +141,22 @@ class Zombie(ppb.Sprite):
         third_max = max(third_min, math.floor(spawn_max * cls.max_third_cut))
 
         offset_limit = config.Zombie.spawn_offset_base
-        for _ in range(randint(first_min, first_max) + randint(second_min, second_max) + randint(third_min, third_max)):
-            offset_vector = ppb.Vector(uniform(-offset_limit, offset_limit), uniform(-offset_limit, offset_limit))
+        for _ in range(rng.randint(first_min, first_max) + rng.randint(second_min, second_max) + rng.randint(third_min, third_max)):
+            offset_vector = ppb.Vector(rng.uniform(-offset_limit, offset_limit), rng.uniform(-offset_limit, offset_limit))
             spawn_position = group_origin + offset_vector
             if ((player.position - spawn_position).length <= cls.awareness
                     or cls.check_outside_limit(spawn_position, left_limit, right_limit, bottom_limit, top_limit)):
                 continue
-            scene.add(cls(position=group_origin + offset_vector))
+            scene.add(pools.acquire(cls, position=group_origin + offset_vector))
             scene.spawned += 1
 
-    @utils.debounce(config.Fire.debounce)
-    def on_mobile_in_fire(self, event, signal):
-        self.heat += 1
+    def burn(self, scene):
+        if scene.timers.cooldown((self, "burn"), config.Fire.debounce):
+            self.heat += 1
 
-    @utils.debounce(config.Zombie.reduce_heat_debounce)
-    def reduce_heat(self):
-        self.heat = max(0, self.heat - 1)
-
-    def on_cry(self, event, signal):
-        if not self.chase_target and (self.position - event.source.position).length >= self.awareness:
-            self.chase_target = event.source.chase_target
+    def reduce_heat(self, scene):
+        if self.heat and scene.timers.cooldown((self, "reduce_heat"), config.Zombie.reduce_heat_debounce):
+            self.heat = max(0, self.heat - 1)
 
     @staticmethod
     def check_outside_limit(position, left, right, bottom, top) -> bool:
@@ -143,6 +165,9 @@ class Zombie(ppb.Sprite):
         return x_result or y_result
 
 
+Zombie.brain = compiler.compile_tree(Zombie.tree, Zombie)
+
+
 class Skeleton(Zombie):
     speed_modifer = config.Skeleton.speed_modifer
     awareness = config.Skeleton.awareness
@@ -154,14 +179,15 @@ class Skeleton(Zombie):
     @classmethod
     def spawn(cls, scene):
         top_limit, right_limit, bottom_limit, left_limit = scene.play_space_limits
-        count = randint(1, scene.level) if scene.level > 1 else 1
+        rng = scene.rng
+        count = rng.randint(1, scene.level) if scene.level > 1 else 1
         for _ in range(count):
             spawn_position = ppb.Vector(
-                uniform(left_limit, right_limit),
-                uniform(top_limit, bottom_limit)
+                rng.uniform(left_limit, right_limit),
+                rng.uniform(top_limit, bottom_limit)
             )
-            player = next(scene.get(kind=player_module.Player))
+            player = scene.player
             if (player.position - spawn_position).length <= cls.awareness:
                 continue
-            scene.add(cls(position=spawn_position))
+            scene.add(pools.acquire(cls, position=spawn_position))
             scene.spawned += 1
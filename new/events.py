@@ -1,4 +1,5 @@
 from __future__ import annotations
+import typing
 from dataclasses import dataclass
 
 import ppb
@@ -8,8 +9,8 @@ import scenes
 
 
 @dataclass
-class EnemyKilled:
-    enemy: enemies.Zombie
+class EnemiesKilled:
+    enemies: typing.List[enemies.Zombie]
     scene: scenes.Game = None
 
 
@@ -20,6 +21,7 @@ class GameOver:
 
 @dataclass
 class PlayerHurt:
+    hits: int = 1
     scene: scenes.Game = None
 
 
@@ -31,5 +33,6 @@ class ShotFired:
 
 
 @dataclass
-class MobileInFire:
+class MobilesInFire:
+    mobiles: list
     scene: scenes.Game = None
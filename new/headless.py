@@ -0,0 +1,152 @@
+"""
+Run the game without a window.
+
+Steps a scene with a fixed time_delta and scripted input. There is no
+renderer and no asset loading, only the simulation. Run as a script to
+measure simulated ticks per second:
+
+    python headless.py --ticks 3600 --level 5
+"""
+from __future__ import annotations
+import argparse
+import os
+from collections import defaultdict
+from dataclasses import dataclass
+from time import perf_counter
+from typing import Dict, Iterable, List
+
+import ppb
+from ppb import systemslib
+from ppb.camera import Camera
+
+import config
+import profiler
+import scenes
+import systems
+
+Script = Dict[int, List[object]]
+
+
+class HeadlessRenderer(systemslib.System):
+    """
+    Stands in for the Renderer: every scene gets a camera, nothing is drawn.
+    """
+
+    def on_scene_started(self, event: ppb.events.SceneStarted, signal):
+        event.scene.main_camera = Camera(self, config.Game.main_camera_width, config.Headless.resolution)
+
+
+@dataclass
+class RunReport:
+    ticks: int
+    simulated_seconds: float
+    wall_seconds: float
+    scene: str
+
+    @property
+    def ticks_per_second(self) -> float:
+        return self.ticks / self.wall_seconds if self.wall_seconds else float("inf")
+
+    @property
+    def speed_up(self) -> float:
+        return self.simulated_seconds / self.wall_seconds if self.wall_seconds else float("inf")
+
+
+class Runner:
+    """
+    Drives a GameEngine by hand, one Idle, Update and PreRender per tick.
+
+    script maps a tick number to the input events to signal before it.
+    """
+    default_systems = (systems.SimulationTime, systems.ScoreSystem, systems.Controller, systems.EnemyBrains)
+
+    def __init__(self, scene=scenes.Game, *, time_delta=config.Headless.time_delta,
+                 script: Script = None, systems: Iterable = default_systems, scene_kwargs=None, time_scale=None,
+                 **engine_kwargs):
+        self.time_delta = time_delta
+        self.script = script or {}
+        self.engine = ppb.GameEngine(
+            scene,
+            basic_systems=(HeadlessRenderer,),
+            systems=systems,
+            scene_kwargs=scene_kwargs,
+            time_scale=time_scale,
+            **engine_kwargs
+        )
+        self.time_scale = config.Clock.time_scale if time_scale is None else time_scale
+        self.tick = 0
+
+    def __enter__(self):
+        self.engine.__enter__()
+        self.engine.start()
+        self.drain()
+        return self
+
+    def __exit__(self, *exc):
+        self.engine.__exit__(*exc)
+
+    @property
+    def scene(self):
+        return self.engine.current_scene
+
+    def drain(self):
+        engine = self.engine
+        while engine.events:
+            engine.publish()
+
+    def step(self):
+        engine = self.engine
+        time_delta = self.time_delta
+        for event in self.script.get(self.tick, ()):
+            engine.signal(event)
+        engine.signal(ppb.events.Idle(time_delta))
+        engine.signal(ppb.events.Update(time_delta))
+        engine.signal(ppb.events.PreRender(time_delta))
+        self.drain()
+        self.tick += 1
+
+    def run(self, ticks) -> RunReport:
+        start_tick = self.tick
+        start = perf_counter()
+        while self.tick - start_tick < ticks and self.engine.running:
+            self.step()
+        elapsed = perf_counter() - start
+        ran = self.tick - start_tick
+        return RunReport(ran, ran * self.time_delta * self.time_scale, elapsed, type(self.scene).__name__)
+
+
+def firing_script(ticks, every, target=ppb.Vector(10, 0)) -> Script:
+    """
+    Fire the primary weapon at target every few ticks.
+    """
+    script = defaultdict(list)
+    for tick in range(0, ticks, every):
+        script[tick].append(ppb.events.ButtonReleased(ppb.buttons.Primary, target))
+    return script
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Step the Game scene without a window.")
+    parser.add_argument("--ticks", type=int, default=3600)
+    parser.add_argument("--level", type=int, default=1)
+    parser.add_argument("--time-delta", type=float, default=config.Headless.time_delta)
+    parser.add_argument("--time-scale", type=float, default=None, help="Run this many fixed steps per tick.")
+    parser.add_argument("--profile", default=None, help="Write a Chrome trace of every event to this file.")
+    parser.add_argument("--fire-every", type=int, default=0, help="Fire the primary weapon every N ticks.")
+    args = parser.parse_args(argv)
+
+    script = firing_script(args.ticks, args.fire_every) if args.fire_every else None
+    engine_kwargs = {}
+    if args.profile:
+        engine_kwargs = {"systems": Runner.default_systems + (profiler.Profiler,), "profile": args.profile}
+    with Runner(scene_kwargs={"level": args.level}, time_delta=args.time_delta, script=script,
+                time_scale=args.time_scale, **engine_kwargs) as runner:
+        report = runner.run(args.ticks)
+    print(f"{report.ticks} ticks ({report.simulated_seconds:.1f}s simulated) in {report.wall_seconds:.2f}s: "
+          f"{report.ticks_per_second:.0f} ticks/s, {report.speed_up:.1f}x real time, ended in {report.scene}")
+
+
+if __name__ == "__main__":
+    main()
+    # Asset loading never starts headless, so its waiter threads never finish.
+    os._exit(0)
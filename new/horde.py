@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import ppb
+from ppb import gomlib
+
+import config
+
+try:
+    import numpy
+except ImportError:  # The horde engine is optional, the sprites can move themselves.
+    numpy = None
+
+IDLE = 0
+WANDER = 1
+CHASE = 2
+LUNGE = 3
+FLEE = 4
+FOLLOW = 5
+
+available = numpy is not None
+
+
+class Member:
+    """
+    Mixin for sprites the HordeEngine moves.
+
+    While registered the engine holds the real position and a sprite only
+    builds its ppb.Vector when something reads it, the renderer or a
+    behavior, not on every step. Setting position marks the slot dirty so
+    the next step picks it up.
+    """
+    horde: HordeEngine = None
+    horde_slot = 0
+    _position = ppb.Vector(0, 0)
+
+    @property
+    def position(self) -> ppb.Vector:
+        horde = self.horde
+        if horde is not None and horde.stale[self.horde_slot]:
+            horde.stale[self.horde_slot] = False
+            self._position = ppb.Vector(*horde.position[self.horde_slot].tolist())
+        return self._position
+
+    @position.setter
+    def position(self, value):
+        self._position = value
+        horde = self.horde
+        if horde is not None:
+            horde.stale[self.horde_slot] = False
+            horde.dirty[self.horde_slot] = True
+
+
+class HordeEngine(gomlib.GameObject):
+    """
+    Struct-of-arrays movement for enemies.
+
+    Behavior nodes record a movement intent for the tick with steer() or
+    seek(), step() integrates every intent at once. Positions stay in the
+    array, marked stale, until a Member reads them back. An intent can
+    carry its own time_delta, for actors whose brain only ticks every few
+    frames.
+    """
+
+    def __init__(self, capacity=config.Horde.initial_capacity, **props):
+        super().__init__(**props)
+        self.actors = []
+        self.intents = []  # (slot, x, y, speed, time_delta, phase), xy is the target when chasing.
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        old = getattr(self, "position", None)
+        self.capacity = capacity
+        arrays = {
+            "position": numpy.zeros((capacity, 2)),
+            "dirty": numpy.zeros(capacity, dtype=bool),  # The sprite moved itself.
+            "stale": numpy.zeros(capacity, dtype=bool),  # The sprite hasn't read its new position.
+        }
+        if old is not None:
+            count = len(self.actors)
+            for name, array in arrays.items():
+                array[:count] = getattr(self, name)[:count]
+        for name, array in arrays.items():
+            setattr(self, name, array)
+
+    def __contains__(self, actor) -> bool:
+        return actor.horde is self
+
+    def __len__(self) -> int:
+        return len(self.actors)
+
+    def register(self, actor: Member):
+        slot = len(self.actors)
+        if slot == self.capacity:
+            self._allocate(self.capacity * 2)
+        self.position[slot] = actor.position
+        self.dirty[slot] = self.stale[slot] = False
+        self.actors.append(actor)
+        actor.horde = self
+        actor.horde_slot = slot
+
+    def unregister(self, actor: Member):
+        slot = actor.horde_slot
+        actor.position  # Read back before the slot goes.
+        actor.horde = None
+        last = len(self.actors) - 1
+        if self.intents:
+            # Drops the leaving actor's intent, the last actor's follows it to its new slot.
+            self.intents = [
+                (slot if intent[0] == last else intent[0],) + intent[1:]
+                for intent in self.intents if intent[0] != slot
+            ]
+        if slot != last:
+            moved = self.actors[last]
+            self.actors[slot] = moved
+            moved.horde_slot = slot
+            for array in (self.position, self.dirty, self.stale):
+                array[slot] = array[last]
+        self.actors.pop()
+
+    def steer(self, actor: Member, direction: ppb.Vector, speed, phase=WANDER, time_delta=0):
+        self.intents.append((actor.horde_slot, direction.x, direction.y, speed, time_delta, phase))
+
+    def seek(self, actor: Member, target: ppb.Vector, speed, time_delta=0):
+        self.intents.append((actor.horde_slot, target.x, target.y, speed, time_delta, CHASE))
+
+    def step(self, time_delta):
+        intents = self.intents
+        if not intents:
+            return
+        self.intents = []
+        count = len(self.actors)
+        position = self.position[:count]
+        dirty = self.dirty[:count]
+        if dirty.any():
+            # Something outside the engine (wall pushes) moved the sprite.
+            slots = numpy.flatnonzero(dirty)
+            actors = self.actors
+            position[slots] = [tuple(actors[slot]._position) for slot in slots.tolist()]
+            dirty[:] = False
+
+        table = numpy.array(intents)
+        # The last intent of the tick wins, as it would setting position.
+        _, first = numpy.unique(table[::-1, 0], return_index=True)
+        table = table[len(table) - 1 - first]
+        slots = table[:, 0].astype(numpy.intp)
+        vector = table[:, 1:3]
+        span = table[:, 4]
+        span[span <= 0] = time_delta
+        chasing = table[:, 5] == CHASE
+        if chasing.any():
+            offset = vector[chasing] - position[slots[chasing]]
+            length = numpy.hypot(offset[:, 0], offset[:, 1])[:, None]
+            vector[chasing] = numpy.divide(offset, length, out=numpy.zeros_like(offset), where=length > 0)
+        position[slots] += vector * (table[:, 3] * span)[:, None]
+        self.stale[slots] = True
@@ -0,0 +1,98 @@
+from __future__ import annotations
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from random import Random
+from typing import List, Tuple
+
+import ppb
+
+import config
+import spatial
+import terrain
+
+Limits = Tuple[int, int, int, int]
+
+_worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="level")
+
+
+@dataclass
+class Layout:
+    """
+    Everything about a level that doesn't need a sprite.
+    """
+    level: int
+    play_space_limits: Limits
+    walls: List[ppb.Vector]
+    hazards: List[ppb.Vector]
+    collision_map: spatial.CollisionMap
+    hazard_mask: spatial.CellMask
+    flow_field: spatial.FlowField
+    rng: Random
+
+
+def play_space_limits(level) -> Limits:
+    limits_value = 10 + (3 * level)
+    return limits_value, limits_value, -limits_value, -limits_value
+
+
+def wall_positions(level, limits: Limits, rng: Random) -> List[ppb.Vector]:
+    """
+    x x x x x x x
+    x . . . . . x
+    x . . . . . x
+    x . . . . . x
+    x . . . . . x
+    x . . . . . x
+    x x x x x x x
+
+    A border just outside limits and three scattered walls per level.
+    """
+    top = limits[0] + 1
+    left = limits[3] - 1
+    right = limits[1] + 1
+    bottom = limits[2] - 1
+
+    all_walls = []
+    all_walls.extend([ppb.Vector(x, top) for x in range(left, right + 1, 2)])  # Top walls
+    all_walls.extend([ppb.Vector(x, bottom) for x in range(left, right + 1, 2)])  # Bottom walls
+    all_walls.extend([ppb.Vector(left, x) for x in range(bottom, top, 2)])  # Left walls
+    all_walls.extend([ppb.Vector(right, x) for x in range(bottom, top, 2)])  # right walls
+    all_walls.extend([ppb.Vector(rng.randint(left, right), rng.randint(bottom, top)) for _ in range(level * 3)])
+    rng.shuffle(all_walls)
+    return all_walls
+
+
+def hazard_positions(level, limits: Limits, rng: Random) -> List[ppb.Vector]:
+    top, right, bottom, left = limits
+    number_of_hazards = level - config.Game.hazard_min_level
+    return [ppb.Vector(rng.randint(left, right), rng.randint(bottom, top)) for _ in range(max(0, number_of_hazards))]
+
+
+def build(level, seed=None) -> Layout:
+    """
+    Lay out level with a fresh Random(seed). The Layout keeps that Random
+    so the scene carries on with the same stream.
+    """
+    rng = Random(seed)
+    limits = play_space_limits(level)
+    walls = wall_positions(level, limits, rng)
+    hazards = hazard_positions(level, limits, rng)
+    collision_map = spatial.CollisionMap(walls)
+    flow_field = spatial.FlowField(collision_map, limits)
+    return Layout(
+        level,
+        limits,
+        walls,
+        hazards,
+        collision_map,
+        spatial.CellMask(hazards, terrain.Hazard.width),
+        flow_field,
+        rng
+    )
+
+
+def prepare(level, seed=None) -> Future:
+    """
+    Build the layout of level on the worker thread.
+    """
+    return _worker.submit(build, level, seed)
@@ -1,9 +1,25 @@
 from __future__ import annotations
+import argparse
 
 import ppb
 
 from shared import TITLE
 from scenes import TitleScreen, Sandbox
-from systems import ScoreSystem, Controller
+from systems import SimulationTime, ScoreSystem, Controller, EnemyBrains
+from profiler import Profiler
+from replay import Recorder
 
-ppb.run(starting_scene=TitleScreen, title=TITLE, systems=[ScoreSystem, Controller])
+parser = argparse.ArgumentParser(description=TITLE)
+parser.add_argument("--seed", type=int, default=None, help="Seed the game for a reproducible run.")
+parser.add_argument("--record", default=None, help="Record the input of the first game to this file.")
+parser.add_argument("--profile", default=None, help="Time every event and write a Chrome trace to this file.")
+args = parser.parse_args()
+
+ppb.run(
+    starting_scene=TitleScreen,
+    scene_kwargs={"seed": args.seed},
+    title=TITLE,
+    systems=[SimulationTime, ScoreSystem, Controller, EnemyBrains, Recorder, Profiler],
+    record=args.record,
+    profile=args.profile
+)
@@ -1,19 +1,18 @@
 from __future__ import annotations
-from random import randint, uniform
-from time import perf_counter
 
 import ppb
 from ppb import buttons
 
 import config
 import events
-import utils
+import pools
 
 
 class Bullet(ppb.Sprite):
     image = ppb.Triangle(200, 200, 75)
     basis = ppb.directions.Up
     size = config.Bullet.size
+    pooled = True
 
     speed_modifer = config.Bullet.speed_modifier
     direction = ppb.directions.Up
@@ -21,12 +20,11 @@ class Bullet(ppb.Sprite):
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
-        self.starting_position = self.position
-
-    def on_update(self, event: ppb.events.Update, signal):
-        self.position += self.direction * self.speed_modifer * config.Root.base_speed * event.time_delta
-        if (self.position - self.starting_position).length >= self.max_distance:
-            event.scene.remove(self)
+        speed = self.speed_modifer * config.Root.base_speed
+        self.velocity = self.direction * speed
+        self.lifetime = self.max_distance / speed
+        # Where the last collision check left the bullet, hits are swept from here.
+        self.swept_from = self.position
 
 
 class Player(ppb.Sprite):
@@ -36,17 +34,16 @@ class Player(ppb.Sprite):
     heat = 0
     max_heat = config.Player.max_heat
     primary_cooldown = config.Player.primary_cooldown
-    last_fire_weapon_primary = 0
     secondary_cooldown = config.Player.secondary_cooldown
-    last_fire_weapon_secondary = 0
 
     def on_button_released(self, event: ppb.events.ButtonReleased, signal):
-        now = perf_counter()
-        if event.button is ppb.buttons.Primary and now > self.last_fire_weapon_primary + self.primary_cooldown:
+        timers = event.scene.timers
+        if event.button is ppb.buttons.Primary and timers.cooldown((self, "primary"), self.primary_cooldown):
             direction = (event.position - self.position).normalize()
 
             event.scene.add(
-                Bullet(
+                pools.acquire(
+                    Bullet,
                     position=self.position + direction,
                     direction=direction,
                     facing=direction,
@@ -54,23 +51,27 @@ class Player(ppb.Sprite):
                 )
             )
 
-            signal(events.ShotFired(self.position, config.Player.primary_noise_scalar))
-            self.last_fire_weapon_primary = now
-        elif event.button is ppb.buttons.Secondary and now > self.last_fire_weapon_secondary + self.secondary_cooldown:
+            self.fire_noise(event.scene, config.Player.primary_noise_scalar, signal)
+        elif event.button is ppb.buttons.Secondary and timers.cooldown((self, "secondary"), self.secondary_cooldown):
             direction = (event.position - self.position).normalize()
             spread = config.Player.secondary_spread
-            for _ in range(randint(1, 2) + randint(1, 2) + randint(0, 1)):
-                new_facing = direction.rotate(uniform(-spread, spread))
+            rng = event.scene.rng
+            for _ in range(rng.randint(1, 2) + rng.randint(1, 2) + rng.randint(0, 1)):
+                new_facing = direction.rotate(rng.uniform(-spread, spread))
                 event.scene.add(
-                    Bullet(
+                    pools.acquire(
+                        Bullet,
                         position=self.position + direction,
                         direction=new_facing,
                         facing=new_facing,
                         max_distance=config.Player.secondary_max_distance
                     )
                 )
-            signal(events.ShotFired(self.position, config.Player.secondary_noise_scalar))
-            self.last_fire_weapon_secondary = now
+            self.fire_noise(event.scene, config.Player.secondary_noise_scalar, signal)
+
+    def fire_noise(self, scene, noise, signal):
+        # Only enemies close enough to hear it get the event.
+        signal(events.ShotFired(self.position, noise), targets=scene.listeners(self.position, noise))
 
     def on_update(self, event: ppb.events.Update, signal):
         velocity = event.movement
@@ -78,25 +79,25 @@ class Player(ppb.Sprite):
             velocity = velocity.normalize()
         self.position += velocity * event.time_delta * self.speed
         if self.heat >= self.max_heat:
-            self.handle_heat(signal)
-        self.reduce_heat()
+            self.handle_heat(event.scene, signal)
+        self.reduce_heat(event.scene)
 
     def on_player_hurt(self, event: events.PlayerHurt, signal):
-        self.take_damage(signal)
+        self.take_damage(signal, event.hits)
 
-    @utils.debounce(config.Fire.debounce)
-    def on_mobile_in_fire(self, event, signal):
-        self.heat += config.Fire.heat
+    def burn(self, scene):
+        if scene.timers.cooldown((self, "burn"), config.Fire.debounce):
+            self.heat += config.Fire.heat
 
-    def take_damage(self, signal):
-        self.life -= 1
+    def take_damage(self, signal, amount=1):
+        self.life -= amount
         if self.life <= 0:
             signal(events.GameOver())
 
-    @utils.debounce(config.Player.handle_fire_debounce)
-    def handle_heat(self, signal):
-        self.take_damage(signal)
+    def handle_heat(self, scene, signal):
+        if scene.timers.cooldown((self, "handle_heat"), config.Player.handle_fire_debounce):
+            scene.hurt_player(signal)
 
-    @utils.debounce(config.Player.handle_fire_debounce)
-    def reduce_heat(self):
-        self.heat = max(0, self.heat - 1)
+    def reduce_heat(self, scene):
+        if self.heat and scene.timers.cooldown((self, "reduce_heat"), config.Player.handle_fire_debounce):
+            self.heat = max(0, self.heat - 1)
@@ -0,0 +1,57 @@
+from __future__ import annotations
+from typing import Dict, List
+
+import config
+
+
+class Pool:
+    """
+    Free list of released instances of one kind.
+
+    A recycled instance has its instance state wiped and __init__ run again,
+    so it comes back exactly as a new one would: no tree state, heat or
+    targets survive.
+    """
+
+    def __init__(self, kind: type, limit=config.Pools.limit):
+        self.kind = kind
+        self.limit = limit
+        self.free: List = []
+
+    def __len__(self) -> int:
+        return len(self.free)
+
+    def acquire(self, **props):
+        if not self.free:
+            return self.kind(**props)
+        obj = self.free.pop()
+        obj.__dict__.clear()
+        obj.__init__(**props)
+        return obj
+
+    def release(self, obj):
+        if len(self.free) < self.limit:
+            self.free.append(obj)
+
+
+_pools: Dict[type, Pool] = {}
+
+
+def pool_for(kind: type) -> Pool:
+    try:
+        return _pools[kind]
+    except KeyError:
+        pool = _pools[kind] = Pool(kind)
+        return pool
+
+
+def acquire(kind: type, **props):
+    return pool_for(kind).acquire(**props)
+
+
+def release(obj):
+    """
+    Hand obj back for reuse. Only kinds that set pooled = True are kept.
+    """
+    if getattr(obj, "pooled", False):
+        pool_for(type(obj)).release(obj)
@@ -0,0 +1,151 @@
+"""
+Opt-in timing of every published event.
+
+Pass profile=path to the engine (main.py --profile, headless.py --profile)
+and the Profiler wraps the engine's publish, profile=True does the same
+without writing a file. Every event's handlers are timed together by
+event type, rolled up per frame, shown on screen and streamed to the file
+as Chrome trace-event JSON for chrome://tracing or Perfetto, one frame at
+a time between frames.
+Without it the engine publishes as usual and nothing is timed.
+"""
+from __future__ import annotations
+import json
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from time import perf_counter_ns
+from typing import Dict, TextIO, Tuple, Union
+
+import ppb
+from ppb import systemslib
+
+import config
+from shared import text
+
+@dataclass
+class Frame:
+    """
+    Publishing time spent between two Idle events, by event type.
+    """
+    number: int
+    start_ns: int
+    duration_ns: int = 0
+    events: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+
+    def slowest(self) -> Tuple[str, int]:
+        return max(self.events.items(), key=lambda item: item[1], default=("-", 0))
+
+
+class FrameTimeDisplay(ppb.RectangleSprite):
+    layer = 100
+    offset = ppb.Vector(0, -16)
+    height = 1
+    image = text("frame -")
+
+    def on_pre_render(self, event: ppb.events.PreRender, signal):
+        camera = getattr(event.scene, "main_camera", None)
+        if camera is not None:
+            self.position = camera.position + self.offset
+
+
+class Profiler(systemslib.System):
+
+    def __init__(self, engine: ppb.engine.GameEngine, profile: Union[str, bool] = None, **kwargs):
+        super().__init__(engine=engine, **kwargs)
+        self.path = profile
+        self.file: TextIO = None
+        self.pending = []  # Trace events of the running frame, written when it closes.
+        self.written = 0
+        self.frames = deque(maxlen=config.Profiler.history)
+        self.frame: Frame = None
+        self.origin_ns = perf_counter_ns()
+        if profile is not None:
+            # Shadows GameEngine.publish on this engine only.
+            self.engine_publish = engine.publish
+            engine.publish = self.publish
+
+    def __enter__(self):
+        if isinstance(self.path, str):
+            self.file = open(self.path, "w")
+            self.file.write('{"displayTimeUnit": "ms", "traceEvents": [\n')
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.file is not None:
+            self.close_frame(perf_counter_ns())
+            self.flush()
+            self.file.write("\n]}\n")
+            self.file.close()
+            self.file = None
+
+    def trace(self, name, category, start_ns, duration_ns, tid=0):
+        self.pending.append((name, category, start_ns, duration_ns, tid))
+
+    def flush(self):
+        origin_ns = self.origin_ns
+        lines = [
+            json.dumps({
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": (start_ns - origin_ns) / 1000,
+                "dur": duration_ns / 1000,
+                "pid": 0,
+                "tid": tid,
+            })
+            for name, category, start_ns, duration_ns, tid in self.pending
+        ]
+        if lines:
+            self.file.write((",\n" if self.written else "") + ",\n".join(lines))
+            self.written += len(lines)
+        self.pending.clear()
+
+    def close_frame(self, now_ns):
+        frame = self.frame
+        if frame is None:
+            return
+        frame.duration_ns = now_ns - frame.start_ns
+        self.frames.append(frame)
+        if self.file is not None:
+            self.trace(f"frame {frame.number}", "frame", frame.start_ns, frame.duration_ns, tid=1)
+
+    def next_frame(self):
+        self.close_frame(perf_counter_ns())
+        if self.file is not None:
+            self.flush()
+        # Started after the write, so no frame pays for it.
+        self.frame = Frame(self.frame.number + 1 if self.frame else 0, perf_counter_ns())
+
+    def on_scene_started(self, event: ppb.events.SceneStarted, signal):
+        if self.path is not None:
+            event.scene.add(FrameTimeDisplay())
+
+    def on_pre_render(self, event: ppb.events.PreRender, signal):
+        if self.path is None or not self.frames or self.frames[-1].number % config.Profiler.hud_interval:
+            return
+        frame = self.frames[-1]
+        slowest, slowest_ns = frame.slowest()
+        scene = event.scene
+        image = text(
+            f"frame {frame.duration_ns / 1e6:.1f} ms, {slowest} {slowest_ns / 1e6:.1f} ms, "
+            f"{getattr(scene, 'visible_sprites', '-')} drawn, {getattr(scene, 'culled_sprites', '-')} culled"
+        )
+        for display in scene.get(kind=FrameTimeDisplay):
+            display.image = image
+
+    def publish(self):
+        """
+        GameEngine.publish, with a clock around it.
+        """
+        event = self.engine.events[0]
+        category = type(event).__name__
+        if isinstance(event, ppb.events.Idle) and not getattr(event, "fast_forward", False):
+            self.next_frame()
+        start_ns = perf_counter_ns()
+        try:
+            self.engine_publish()
+        finally:
+            duration_ns = perf_counter_ns() - start_ns
+            if self.frame is not None:
+                self.frame.events[category] += duration_ns
+            if self.file is not None:  # profile=True only keeps the frame totals.
+                self.trace(category, "event", start_ns, duration_ns)
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import ppb
+
+import config
+
+try:
+    import numpy
+except ImportError:  # Bullets fall back to moving in a plain loop.
+    numpy = None
+
+
+class ProjectileBuffer:
+    """
+    Moves every bullet of a scene in one step.
+
+    With numpy the positions, velocities and remaining lifetimes live in
+    arrays and the sprites only get their new position written back.
+    Without it the same step runs as a plain loop over the sprites.
+    """
+
+    def __init__(self, capacity=config.Bullet.initial_capacity):
+        self.bullets = []
+        self.slots = {}
+        if numpy is not None:
+            self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        old = getattr(self, "position", None)
+        self.capacity = capacity
+        arrays = {
+            "position": numpy.zeros((capacity, 2)),
+            "velocity": numpy.zeros((capacity, 2)),
+            "life": numpy.zeros(capacity),
+        }
+        if old is not None:
+            count = len(self.bullets)
+            for name, array in arrays.items():
+                array[:count] = getattr(self, name)[:count]
+        for name, array in arrays.items():
+            setattr(self, name, array)
+
+    def __contains__(self, bullet) -> bool:
+        return bullet in self.slots
+
+    def __len__(self) -> int:
+        return len(self.bullets)
+
+    def register(self, bullet):
+        slot = len(self.bullets)
+        if numpy is not None and slot == self.capacity:
+            self._allocate(self.capacity * 2)
+        self.bullets.append(bullet)
+        self.slots[bullet] = slot
+        if numpy is not None:
+            self.position[slot] = bullet.position
+            self.velocity[slot] = bullet.velocity
+            self.life[slot] = bullet.lifetime
+
+    def unregister(self, bullet):
+        slot = self.slots.pop(bullet)
+        last = len(self.bullets) - 1
+        if slot != last:
+            moved = self.bullets[last]
+            self.bullets[slot] = moved
+            self.slots[moved] = slot
+            if numpy is not None:
+                for array in (self.position, self.velocity, self.life):
+                    array[slot] = array[last]
+        self.bullets.pop()
+
+    def step(self, time_delta) -> list:
+        """
+        Advance every bullet and return the ones whose lifetime ran out.
+        """
+        if numpy is None:
+            expired = []
+            for bullet in self.bullets:
+                bullet.position += bullet.velocity * time_delta
+                bullet.lifetime -= time_delta
+                if bullet.lifetime <= 0:
+                    expired.append(bullet)
+            return expired
+
+        count = len(self.bullets)
+        if not count:
+            return []
+        position = self.position[:count]
+        life = self.life[:count]
+        position += self.velocity[:count] * time_delta
+        life -= time_delta
+        bullets = self.bullets
+        for bullet, (x, y) in zip(bullets, position.tolist()):
+            bullet.position = ppb.Vector(x, y)
+        return [bullets[slot] for slot in numpy.flatnonzero(life <= 0).tolist()]
@@ -0,0 +1,223 @@
+"""
+Record player input and replay it without a window.
+
+A recording is a header with the seed and level of the first Game scene,
+then one small record per Idle, run of Updates, PreRender and input event,
+in the order the engine published them. A live engine batches as many
+Updates per Idle, and so per collision pass, as wall time allows, the
+replay signals exactly the same batches. Replays step a seeded headless
+Game as fast as possible and hash the simulation state after every frame,
+so two runs can be diffed:
+
+    python main.py --seed 7 --record run.zrpl
+    python replay.py run.zrpl --hashes run.hashes
+"""
+from __future__ import annotations
+import argparse
+import hashlib
+import os
+import struct
+from dataclasses import dataclass
+from typing import BinaryIO, List
+
+import ppb
+from ppb import buttons, keycodes, systemslib
+
+import config
+import enemies
+import headless
+import players
+import scenes
+
+MAGIC = b"ZRPL"
+VERSION = 2
+HEADER = struct.Struct("<4sHQHd")  # magic, version, seed, level, time step
+EVENT = struct.Struct("<IBH")  # updates so far, kind, code
+POSITION = struct.Struct("<dd")
+
+KEY_PRESSED = 0
+KEY_RELEASED = 1
+BUTTON_RELEASED = 2
+END = 3
+IDLE = 4
+UPDATES = 5  # code is how many Updates in a row.
+PRE_RENDER = 6
+
+KEYS = (keycodes.W, keycodes.A, keycodes.S, keycodes.D)
+BUTTONS = (buttons.Primary, buttons.Secondary)
+
+Frame = list  # An Idle and the events published after it, up to the next one.
+
+
+@dataclass
+class Recording:
+    seed: int
+    level: int
+    time_step: float
+    ticks: int
+    frames: List[Frame]
+
+
+class Recorder(systemslib.System):
+    """
+    Writes the input and the frame timing of the first Game played to a
+    recording file.
+
+    Enabled by passing record=path to the engine, recording stops at game
+    over.
+    """
+
+    def __init__(self, record: str = None, **kwargs):
+        super().__init__(**kwargs)
+        self.path = record
+        self.file: BinaryIO = None
+        self.tick = 0
+        self.updates = 0  # Updates since the last record.
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def write(self, kind, code=0):
+        if self.updates:
+            self.file.write(EVENT.pack(self.tick, UPDATES, self.updates))
+            self.updates = 0
+        self.file.write(EVENT.pack(self.tick, kind, code))
+
+    def close(self):
+        if self.file is not None:
+            self.write(END)
+            self.file.close()
+            self.file = None
+            self.path = None
+
+    def on_scene_started(self, event: ppb.events.SceneStarted, signal):
+        if self.path is None or self.file is not None or not isinstance(event.scene, scenes.Game):
+            return
+        self.file = open(self.path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, event.scene.seed, event.scene.level, config.Clock.time_step))
+
+    def on_idle(self, event: ppb.events.Idle, signal):
+        if self.file is not None:
+            self.write(IDLE)
+
+    def on_update(self, event: ppb.events.Update, signal):
+        if self.file is not None:
+            self.tick += 1
+            self.updates += 1
+
+    def on_pre_render(self, event: ppb.events.PreRender, signal):
+        if self.file is not None:
+            self.write(PRE_RENDER)
+
+    def on_key_pressed(self, event: ppb.events.KeyPressed, signal):
+        if self.file is not None and event.key in KEYS:
+            self.write(KEY_PRESSED, KEYS.index(event.key))
+
+    def on_key_released(self, event: ppb.events.KeyReleased, signal):
+        if self.file is not None and event.key in KEYS:
+            self.write(KEY_RELEASED, KEYS.index(event.key))
+
+    def on_button_released(self, event: ppb.events.ButtonReleased, signal):
+        if self.file is not None and event.button in BUTTONS:
+            self.write(BUTTON_RELEASED, BUTTONS.index(event.button))
+            self.file.write(POSITION.pack(event.position.x, event.position.y))
+
+    def on_game_over(self, event, signal):
+        self.close()
+
+
+def load(path) -> Recording:
+    with open(path, "rb") as file:
+        data = file.read()
+    magic, version, seed, level, time_step = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a version {VERSION} recording.")
+
+    frames = [[]]  # Input can arrive before the first Idle.
+    offset = HEADER.size
+    ticks = 0
+    while offset < len(data):
+        tick, kind, code = EVENT.unpack_from(data, offset)
+        offset += EVENT.size
+        ticks = max(ticks, tick)
+        if kind == IDLE:
+            frames.append([ppb.events.Idle(time_step)])
+        elif kind == UPDATES:
+            frames[-1].extend(ppb.events.Update(time_step) for _ in range(code))
+        elif kind == PRE_RENDER:
+            frames[-1].append(ppb.events.PreRender(time_step))
+        elif kind == KEY_PRESSED:
+            frames[-1].append(ppb.events.KeyPressed(KEYS[code], set()))
+        elif kind == KEY_RELEASED:
+            frames[-1].append(ppb.events.KeyReleased(KEYS[code], set()))
+        elif kind == BUTTON_RELEASED:
+            x, y = POSITION.unpack_from(data, offset)
+            offset += POSITION.size
+            frames[-1].append(ppb.events.ButtonReleased(BUTTONS[code], ppb.Vector(x, y)))
+        elif kind == END:
+            break
+        else:
+            raise ValueError(f"Unknown record kind {kind} at byte {offset - EVENT.size}.")
+    return Recording(seed, level, time_step, ticks, [frame for frame in frames if frame])
+
+
+def state_hash(scene) -> str:
+    """
+    A short digest of everything the simulation moves.
+    """
+    digest = hashlib.blake2b(type(scene).__name__.encode(), digest_size=8)
+    if isinstance(scene, scenes.IndexedScene):
+        values = [scene.clock.now]
+        player = scene.player
+        if player is not None:
+            values.extend((player.position.x, player.position.y, player.life, player.heat))
+        for enemy in scene.get(kind=enemies.Zombie):
+            values.extend((enemy.position.x, enemy.position.y, enemy.heat))
+        for bullet in scene.get(kind=players.Bullet):
+            values.extend((bullet.position.x, bullet.position.y))
+        digest.update(struct.pack(f"<{len(values)}d", *values))
+    return digest.hexdigest()
+
+
+def replay(recording: Recording, ticks=None) -> List[str]:
+    """
+    Run recording headless and return the state hash after every frame.
+
+    Each frame is signalled as a whole before it is published, the way a
+    live engine queues the Updates and input of one Idle.
+    """
+    ticks = recording.ticks if ticks is None else ticks
+    hashes = []
+    scene_kwargs = {"seed": recording.seed, "level": recording.level}
+    with headless.Runner(time_delta=recording.time_step, scene_kwargs=scene_kwargs) as runner:
+        engine = runner.engine
+        for frame in recording.frames:
+            if runner.tick >= ticks or not engine.running:
+                break
+            for event in frame:
+                engine.signal(event)
+            runner.drain()
+            runner.tick += sum(isinstance(event, ppb.events.Update) for event in frame)
+            hashes.append(state_hash(runner.scene))
+    return hashes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recording headless and hash every frame.")
+    parser.add_argument("recording")
+    parser.add_argument("--ticks", type=int, default=None, help="Stop after this many Updates.")
+    parser.add_argument("--hashes", default=None, help="Write one state hash per frame to this file.")
+    args = parser.parse_args(argv)
+
+    recording = load(args.recording)
+    hashes = replay(recording, args.ticks)
+    if args.hashes:
+        with open(args.hashes, "w") as file:
+            file.writelines(f"{digest}\n" for digest in hashes)
+    print(f"{len(hashes)} frames, seed {recording.seed}, level {recording.level}, final state {hashes[-1] if hashes else '-'}")
+
+
+if __name__ == "__main__":
+    main()
+    # Asset loading never starts headless, so its waiter threads never finish.
+    os._exit(0)
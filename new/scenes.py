@@ -1,18 +1,27 @@
 from __future__ import annotations
 import itertools
 import typing
-from random import uniform, shuffle, randint
+from collections import defaultdict
+from concurrent.futures import Future
+from random import Random, getrandbits
 
 import ppb
 from ppb import keycodes
 from ppb import gomlib
 
-from shared import TITLE, FONT
+from shared import TITLE, text
+import clocks
 import enemies
 import events
+import horde
+import levels
 import players
+import pools
+import projectiles
+import spatial
 import systems
 import terrain
+import timers
 import config
 
 def do_collide(first, second):
@@ -33,93 +42,280 @@ class LifeDisplay(ppb.Sprite):
     layer = 100
     offset = ppb.Vector(0, 0)
 
+
+class Hud(gomlib.GameObject):
+    """
+    The score and the hearts, updated only when something changes.
+
+    Its sprites keep fixed offsets from the camera and are only moved when
+    the camera moves, the hearts are redrawn after a PlayerHurt and the
+    score on EnemiesKilled. A frame where none of that happens costs one
+    flag check.
+    """
+    score_offset = ppb.Vector(12, 16)
+    hurt = False
+
+    def __init__(self, life=config.Player.life, **props):
+        super().__init__(**props)
+        self.score_display = systems.ScoreDisplay(offset=self.score_offset)
+        self.hearts = [
+            LifeDisplay(health_value=value, offset=ppb.Vector(-8 + (-1.5 * value), 16))
+            for value in range(1, config.Player.life + 1)
+        ]
+        self.sprites = [self.score_display, *self.hearts]
+        self.show_life(life)
+
+    def show_life(self, life):
+        for heart in self.hearts:
+            heart.image = heart.full_image if life >= heart.health_value else heart.empty_image
+
+    def follow(self, camera_position: ppb.Vector):
+        for sprite in self.sprites:
+            sprite.position = camera_position + sprite.offset
+
+    def on_player_hurt(self, event: events.PlayerHurt, signal):
+        # Targets are a set, the player may not have taken the damage yet.
+        self.hurt = True
+
     def on_pre_render(self, event: ppb.events.PreRender, signal):
-        player = next(event.scene.get(kind=players.Player))
-        if player.life < self.health_value:
-            self.image = self.empty_image
-        camera = event.scene.main_camera
-        self.position = camera.position + self.offset
+        if self.hurt:
+            self.hurt = False
+            self.show_life(event.scene.player.life)
+
+    def on_enemies_killed(self, event: events.EnemiesKilled, signal):
+        self.score_display.score += sum(enemy.points for enemy in event.enemies)
 
 
 class Collider(gomlib.GameObject):
     primed = False
 
+    def __init__(self, **props):
+        super().__init__(**props)
+        self.bullets = spatial.SpatialHash(box=spatial.swept_box)
+
     def on_update(self, event, signal):
         self.primed = True
 
     def on_idle(self, event: ppb.events.Idle, signal):
-        for_removal = set()
-        player = next(event.scene.get(kind=players.Player))
+        for_removal = {}  # Ordered, so removals happen in the same order every run.
+        player = event.scene.player
         zombies = list(event.scene.get(kind=enemies.Zombie))
         bullets = list(event.scene.get(kind=players.Bullet))
-        wall_colliders = list(event.scene.get(kind=terrain.WallCollider))
-        hazards = list(event.scene.get(kind=terrain.Hazard))
 
         if self.primed:
-            wall: terrain.WallCollider
+            event.scene.enemy_index.sync(zombies)
+
+            collision_map = getattr(event.scene, "collision_map", None)
             mobile: typing.Union[players.Player, enemies.Zombie, players.Bullet]
-            for wall, mobile in itertools.product(wall_colliders, itertools.chain([player], zombies, bullets)):
-                if do_collide(wall, mobile):
+            if collision_map is not None:
+                for mobile in itertools.chain([player], zombies, bullets):
+                    push = collision_map.resolve(mobile)
+                    if push is None:
+                        continue
                     if isinstance(mobile, players.Bullet):
-                        for_removal.add(mobile)
+                        for_removal[mobile] = None
                         continue
-                    mobile.position += wall.normal.scale_to(config.Collider.wall_push)
+                    mobile.position += push
 
-            for hazard, mobile in itertools.product(hazards, itertools.chain([player], zombies)):
-                if do_collide(hazard, mobile):
-                    signal(events.MobileInFire(), targets=[mobile])
+            hazard_mask = event.scene.hazard_mask
+            if hazard_mask is not None:
+                burning = [mobile for mobile in itertools.chain([player], zombies) if hazard_mask.touches(mobile)]
+                if burning:
+                    signal(events.MobilesInFire(burning), targets=[event.scene])
 
+            killed = []
+            hits = 0
+            self.bullets.sync(bullet for bullet in bullets if bullet not in for_removal)
             for enemy in zombies:
-                for bullet in bullets:
+                for bullet in self.bullets.query(enemy):
                     if bullet in for_removal:
                         continue
-                    if do_collide(enemy, bullet):
-                        for_removal.add(enemy)
-                        for_removal.add(bullet)
-                        signal(events.EnemyKilled(enemy))
+                    if spatial.swept_hit(bullet, enemy):
+                        for_removal[enemy] = None
+                        for_removal[bullet] = None
+                        killed.append(enemy)
                         break
                 if enemy in for_removal:
                     continue
                 if do_collide(player, enemy):
-                    for_removal.add(enemy)
-                    signal(events.PlayerHurt())
+                    for_removal[enemy] = None
+                    hits += 1
+            # One event per kind per tick, however big the volley.
+            if killed:
+                signal(events.EnemiesKilled(killed))
+            if hits:
+                event.scene.hurt_player(signal, hits)
             for obj in for_removal:
                 event.scene.remove(obj)
+            for bullet in bullets:
+                bullet.swept_from = bullet.position
             self.primed = False
 
 
+class IndexedScene(ppb.BaseScene):
+    """
+    Scene that keeps live per-kind counts and a handle on the player.
+
+    get(kind=...) answers from insertion ordered per-kind registries instead
+    of ppb's sets, so iteration order, and with it a seeded game, is the
+    same on every run.
+
+    Only sprites overlapping the camera view are handed to the renderer,
+    visible_sprites and culled_sprites count the last frame's split.
+    """
+    player: players.Player = None
+    horde: horde.HordeEngine = None
+    hazard_mask: spatial.CellMask = None
+    visible_sprites = 0
+    culled_sprites = 0
+    enemies_added = 0
+
+    def __init__(self, seed=None, **props):
+        # Unseeded scenes still pick a concrete seed, so any run can be recorded.
+        self.seed = getrandbits(64) if seed is None else seed
+        self.rng = Random(self.seed)
+        self.by_kind = defaultdict(dict)
+        self.projectiles = projectiles.ProjectileBuffer()
+        self.enemy_index = spatial.SpatialHash()
+        self.terrain_index = spatial.SpatialHash(cell_size=config.Culling.cell_size)
+        self.unindexed = {}  # Sprites the render cull checks one by one.
+        self.alerts = spatial.AlertField()
+        self.timers = timers.TimerWheel()
+        self.clock = clocks.SimulationClock()
+        super().__init__(**props)
+
+    def add(self, child, tags=()):
+        child = super().add(child, tags)
+        for kind in type(child).mro():
+            self.by_kind[kind][child] = None
+        if isinstance(child, players.Player):
+            self.player = child
+        elif isinstance(child, players.Bullet):
+            self.projectiles.register(child)
+        elif isinstance(child, enemies.Zombie):
+            self.enemy_index.insert(child)
+            # Spreads far enemies over the frames they tick on.
+            child.lod_phase = self.enemies_added
+            self.enemies_added += 1
+            if self.horde is not None:
+                self.horde.register(child)
+        if isinstance(child, terrain.Terrain):
+            self.terrain_index.insert(child)
+        elif child not in self.enemy_index and hasattr(child, "__image__"):
+            self.unindexed[child] = None
+        return child
+
+    def remove(self, child):
+        child = super().remove(child)
+        for kind in type(child).mro():
+            del self.by_kind[kind][child]
+        if child is self.player:
+            self.player = None
+        elif child in self.projectiles:
+            self.projectiles.unregister(child)
+        elif child in self.enemy_index:
+            self.enemy_index.remove(child)
+            if self.horde is not None:
+                self.horde.unregister(child)
+        if child in self.terrain_index:
+            self.terrain_index.remove(child)
+        self.unindexed.pop(child, None)
+        pools.release(child)
+        return child
+
+    def listeners(self, position: ppb.Vector, noise) -> list:
+        """
+        Enemies that might hear a noise made at position. The index is
+        refreshed by the Collider, so the radius gets a little slack.
+        """
+        radius = enemies.Zombie.hearing_range(noise) + config.Collider.listener_margin
+        return [
+            enemy for enemy in self.enemy_index.query_radius(position, radius)
+            if (enemy.position - position).length <= radius
+        ]
+
+    def hurt_player(self, signal, hits=1):
+        signal(events.PlayerHurt(hits), targets=[self.player, *self.get(kind=Hud)])
+
+    def bake_hazards(self):
+        """
+        Freeze the hazards in the scene into the mask the Collider reads.
+        """
+        self.hazard_mask = spatial.CellMask(
+            (hazard.position for hazard in self.get(kind=terrain.Hazard)),
+            terrain.Hazard.width
+        )
+
+    def on_mobiles_in_fire(self, event: events.MobilesInFire, signal):
+        for mobile in event.mobiles:
+            mobile.burn(self)
+
+    def on_update(self, event: ppb.events.Update, signal):
+        self.timers.advance(event.time_delta)
+        self.alerts.advance(event.time_delta)
+        for bullet in self.projectiles.step(event.time_delta):
+            self.remove(bullet)
+
+    def on_scene_stopped(self, event: ppb.events.SceneStopped, signal):
+        for child in self:
+            pools.release(child)
+
+    def sprite_layers(self) -> typing.Iterator:
+        """
+        Sprites overlapping the camera view plus a margin, in layer order.
+
+        Terrain and enemies are looked up in their spatial indexes, so the
+        cost follows what is on screen rather than the size of the level.
+        """
+        camera = self.main_camera
+        if camera is None:
+            return super().sprite_layers()
+        margin = config.Culling.margin
+        box = (camera.left - margin, camera.bottom - margin, camera.right + margin, camera.top + margin)
+        candidates = itertools.chain(
+            self.terrain_index.query_box(box),
+            self.enemy_index.query_box(box),
+            self.unindexed
+        )
+        visible = [sprite for sprite in candidates if spatial.overlaps(sprite, box)]
+        self.visible_sprites = len(visible)
+        self.culled_sprites = len(self.terrain_index) + len(self.enemy_index) + len(self.unindexed) - len(visible)
+        return iter(sorted(visible, key=lambda sprite: getattr(sprite, "layer", 0)))
+
+    def get(self, *, kind: type = None, tag=None, **kwargs) -> typing.Iterator:
+        if kind is None or tag is not None:
+            return super().get(kind=kind, tag=tag, **kwargs)
+        return iter(self.by_kind.get(kind, ()))
+
+    def count(self, kind) -> int:
+        return len(self.by_kind.get(kind, ()))
+
+
 class TitleScreen(ppb.BaseScene):
     background_color = (0, 0, 0)
     last_score = 0
     top_score = 0
+    seed = None
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.add(
             ppb.RectangleSprite(
-                image=ppb.Text(
-                    TITLE,
-                    font=FONT,
-                    color=(255, 255, 255)
-                ),
+                image=text(TITLE),
                 height=2,
                 position=ppb.Vector(0, 2)
             )
         )
         self.add(
             ppb.RectangleSprite(
-                image=ppb.Text(
-                    "Press SPACE to Start",
-                    font=FONT,
-                    color=(255, 255, 255)
-                ),
+                image=text("Press SPACE to Start"),
                 position=ppb.Vector(0, -2)
             )
         )
 
     def on_key_released(self, event: ppb.events.KeyReleased, signal):
         if event.key is keycodes.Space:
-            signal(ppb.events.StartScene(Game))
+            signal(ppb.events.StartScene(Game, kwargs={"seed": self.seed}))
 
 
 class GameOverScene(ppb.BaseScene):
@@ -131,7 +327,7 @@ class GameOverScene(ppb.BaseScene):
         super().__init__(**kwargs)
         self.add(
             ppb.RectangleSprite(
-                image=ppb.Text("Game Over", font=FONT, color=(255, 255, 255)),
+                image=text("Game Over"),
                 position=ppb.Vector(0, 4)
             )
         )
@@ -139,14 +335,14 @@ class GameOverScene(ppb.BaseScene):
     def on_scene_started(self, event, signal):
         self.add(
             ppb.RectangleSprite(
-                image=ppb.Text(f"You scored {self.last_score}", font=FONT, color=(255, 255, 255)),
+                image=text(f"You scored {self.last_score}"),
                 position=ppb.Vector(0, -2)
             )
         )
         if self.last_score >= self.top_score:
             self.add(
                 ppb.RectangleSprite(
-                    image=ppb.Text("New high score!", font=FONT, color=(255, 255, 255)),
+                    image=text("New high score!"),
                     position=ppb.Vector(0, -4)
                 )
             )
@@ -159,47 +355,77 @@ class GameOverScene(ppb.BaseScene):
         signal(ppb.events.StopScene())
 
 
-class Game(ppb.BaseScene):
+class Game(IndexedScene):
     background_color = (0, 0, 0)
 
     level = 1
     level_spawned = False
-    current_generator = None
+    next_layout: Future = None
+    next_seed: int = None
     spawn_limit = None
     spawned = 0
+    score = 0
+    collision_map = None
+    flow_field = None
     camera_new_blend = config.Game.main_camera_position_blend
 
-    def __init__(self, player_life=10, **props):
+    def __init__(self, player_life=10, layout: levels.Layout = None, **props):
         super().__init__(**props)
+        if layout is None:
+            layout = levels.build(self.level, self.seed)
+        # The level was laid out with this stream, the scene carries on with it.
+        self.rng = layout.rng
+        self.next_seed = self.rng.getrandbits(64)
+        if config.Horde.enabled and horde.available:
+            self.horde = horde.HordeEngine()
         self.add(players.Player(life=player_life))
         self.add(Collider())
-        self.add(systems.ScoreDisplay(offset=ppb.Vector(12, 16)))
-        for value in range(1, 11):
-            self.add(LifeDisplay(health_value=value, offset=(ppb.Vector(-8 + (-1.5 * value), 16))))
+        self.hud = self.add(Hud(life=player_life))
+        for sprite in self.hud.sprites:
+            self.add(sprite)
         self.spawn_timers = {
             enemies.Zombie: [config.Game.zombie_spawn_base, config.Game.zombie_spawn_initial],
             enemies.Skeleton: [config.Game.skeleton_spawn_base, config.Game.skeleton_spawn_initial]
         }
         # Build Level
-        self.generators = [self.generate_walls, self.generate_hazards]
-        limits_value = 10 + (3 * self.level)
-        self.play_space_limits = (limits_value, limits_value, -limits_value, -limits_value)
+        self.spawn_level(layout)
 
         # Spawn setup
         self.spawn_limit = config.Game.spawn_limit_base + (config.Game.spawn_limit_scalar * self.level)
 
+    def spawn_level(self, layout: levels.Layout):
+        self.play_space_limits = layout.play_space_limits
+        for position in layout.walls:
+            self.add(terrain.Wall(position=position))
+        for position in layout.hazards:
+            self.add(terrain.Hazard(position=position))
+        self.collision_map = layout.collision_map
+        self.hazard_mask = layout.hazard_mask
+        self.flow_field = layout.flow_field
+        self.level_spawned = True
+
     def on_scene_started(self, event, signal):
         self.main_camera.width = config.Game.main_camera_width
+        self.hud.score_display.score = self.score
+        self.hud.follow(self.main_camera.position)
+        # Lay out the next level while this one is played.
+        self.next_layout = levels.prepare(self.level + 1, self.next_seed)
 
     def on_update(self, event: ppb.events.Update, signal):
-        if not self.level_spawned:
-            return
-
-        no_enemies = not list(self.get(kind=enemies.Zombie))
+        super().on_update(event, signal)
+        self.flow_field.update(self.player.position)
+        no_enemies = not self.count(enemies.Zombie)
         if self.spawned >= self.spawn_limit:
             if no_enemies:
-                player = next(self.get(kind=players.Player))
-                signal(ppb.events.ReplaceScene(Game, kwargs={"level": self.level + 1, "player_life": player.life}))
+                if self.next_layout is not None and not self.next_layout.done():
+                    return  # Keep the level running until the worker is done.
+                layout = self.next_layout.result() if self.next_layout is not None else None
+                signal(ppb.events.ReplaceScene(Game, kwargs={
+                    "level": self.level + 1,
+                    "player_life": self.player.life,
+                    "layout": layout,
+                    "seed": self.next_seed
+                }))
             return
 
         for kind, timer in self.spawn_timers.items():
@@ -207,77 +433,28 @@ class Game(ppb.BaseScene):
             default = timer[0]
             if timer[1] <= 0:
                 kind.spawn(self)
-                timer[1] = (default * 0.5) + (default * uniform(0, 1))
+                timer[1] = (default * 0.5) + (default * self.rng.uniform(0, 1))
             elif no_enemies:
                 timer[1] /= 2
 
     def on_pre_render(self, event, signal):
-        if not self.level_spawned:
-            if self.current_generator is None:
-                try:
-                    next_generator, *self.generators = self.generators
-                except ValueError:
-                    self.level_spawned = True
-                    return
-                else:
-                    self.current_generator = next_generator(0)
-            try:
-                items = next(self.current_generator)
-            except StopIteration:
-                self.current_generator = None
-            else:
-                for item in items:
-                    self.add(item)
         cam = self.main_camera
-        player = next(self.get(kind=players.Player))
-        cam.position = cam.position * (1 - self.camera_new_blend) + player.position * self.camera_new_blend
+        offset = self.player.position - cam.position
+        if not offset:
+            return
+        if offset.x ** 2 + offset.y ** 2 <= config.Game.main_camera_snap ** 2:
+            # The blend never arrives on its own, finish it.
+            position = self.player.position
+        else:
+            position = cam.position + offset * self.camera_new_blend
+        cam.position = position
+        self.hud.follow(position)
 
     def on_game_over(self, event: events.GameOver, signal):
         signal(ppb.events.ReplaceScene(GameOverScene))
 
-    def generate_walls(self, level):
-        """
-        x x x x x x x
-        x . . . . . x
-        x . . . . . x
-        x . . . . . x
-        x . . . . . x
-        x . . . . . x
-        x x x x x x x
-        :param level:
-        :return:
-        """
-
-        all_walls = []
-        top = self.play_space_limits[0] + 1
-        left = self.play_space_limits[3] - 1
-        right = self.play_space_limits[1] + 1
-        bottom = self.play_space_limits[2] - 1
 
-        all_walls.extend([ppb.Vector(x, top) for x in range(left, right + 1, 2)])  # Top walls
-        all_walls.extend([ppb.Vector(x, bottom) for x in range(left, right + 1, 2)])  # Bottom walls
-        all_walls.extend([ppb.Vector(left, x) for x in range(bottom, top, 2)])  # Left walls
-        all_walls.extend([ppb.Vector(right, x) for x in range(bottom, top, 2)])  # right walls
-        all_walls.extend([ppb.Vector(randint(left, right), randint(bottom, top)) for _ in range(self.level * 3)])
-
-        shuffle(all_walls)
-
-        count = config.Game.wall_spawn_step_count
-        while all_walls:
-            walls = all_walls[:count]
-            all_walls = all_walls[count:]
-            yield [terrain.Wall(position=wall) for wall in walls]
-
-    def generate_hazards(self, level):
-        number_of_hazards = self.level - config.Game.hazard_min_level
-        top, right, bottom, left = self.play_space_limits
-        if number_of_hazards > 0:
-            hazards = [terrain.Hazard(position=ppb.Vector(randint(left, right), randint(bottom, top))) for _ in range(number_of_hazards)]
-            while hazards:
-                yield [hazards.pop()]
-
-
-class Sandbox(ppb.BaseScene):
+class Sandbox(IndexedScene):
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -285,8 +462,97 @@ class Sandbox(ppb.BaseScene):
         self.add(players.Player(position=ppb.Vector(10, 10)))
         self.add(terrain.Hazard(position=ppb.Vector(0, 0)))
         self.add(enemies.Zombie(position=ppb.Vector(0, 0)))
-        for value in range(1, 11):
-            self.add(LifeDisplay(health_value=value, position=(ppb.Vector(-8 + (-1.5 * value), 16))))
+        self.bake_hazards()
+        self.hud = self.add(Hud())
+        for sprite in self.hud.sprites:
+            self.add(sprite)
 
     def on_scene_started(self, event, signal):
         self.main_camera.width = 48
+        self.hud.follow(self.main_camera.position)
+
+
+class StressScene(IndexedScene):
+    """
+    An arena that keeps a fixed population alive around a firing player.
+
+    Killed enemies are replaced every update, so raising zombies between
+    measurements ramps the load. Defaults come from config.Stress.
+    """
+    background_color = (0, 0, 0)
+    level = 1
+    zombies = config.Stress.zombies
+    skeletons = config.Stress.skeletons
+    walls = config.Stress.walls
+    hazards = config.Stress.hazards
+    fire_rate = config.Stress.fire_rate
+    arena = config.Stress.arena
+
+    def __init__(self, **props):
+        super().__init__(**props)
+        if config.Horde.enabled and horde.available:
+            self.horde = horde.HordeEngine()
+        self.play_space_limits = (self.arena, self.arena, -self.arena, -self.arena)
+        self.add(players.Player())
+        self.add(Collider())
+
+        # A border like a level's, then the scattered walls.
+        walls = levels.wall_positions(0, self.play_space_limits, self.rng)
+        walls.extend(self.terrain_position() for _ in range(self.walls))
+        for position in walls:
+            self.add(terrain.Wall(position=position))
+        self.collision_map = spatial.CollisionMap(walls)
+        self.flow_field = spatial.FlowField(self.collision_map, self.play_space_limits)
+        for _ in range(self.hazards):
+            self.add(terrain.Hazard(position=self.terrain_position()))
+        self.bake_hazards()
+
+        self.shots_due = 0
+        self.populate()
+
+    def terrain_position(self) -> ppb.Vector:
+        # Whole units like levels.wall_positions, so terrain covers the same cells.
+        top, right, bottom, left = self.play_space_limits
+        return ppb.Vector(self.rng.randint(left, right), self.rng.randint(bottom, top))
+
+    def random_position(self) -> ppb.Vector:
+        top, right, bottom, left = self.play_space_limits
+        return ppb.Vector(self.rng.uniform(left, right), self.rng.uniform(bottom, top))
+
+    def populate(self):
+        skeletons = self.count(enemies.Skeleton)
+        wanted = (
+            (enemies.Skeleton, self.skeletons - skeletons),
+            (enemies.Zombie, self.zombies - (self.count(enemies.Zombie) - skeletons)),
+        )
+        player = self.player
+        for kind, missing in wanted:
+            for _ in range(missing):
+                position = self.random_position()
+                if (position - player.position).length <= kind.awareness:
+                    continue  # Try again next update.
+                self.add(pools.acquire(kind, position=position))
+
+    def fire(self, signal):
+        player = self.player
+        direction = ppb.directions.Right.rotate(self.rng.uniform(0, 360))
+        self.add(pools.acquire(
+            players.Bullet,
+            position=player.position + direction,
+            direction=direction,
+            facing=direction,
+            max_distance=config.Player.primary_max_distance
+        ))
+        player.fire_noise(self, config.Player.primary_noise_scalar, signal)
+
+    def on_scene_started(self, event, signal):
+        self.main_camera.width = self.arena * 2
+
+    def on_update(self, event: ppb.events.Update, signal):
+        super().on_update(event, signal)
+        self.flow_field.update(self.player.position)
+        self.populate()
+        self.shots_due += event.time_delta * self.fire_rate
+        while self.shots_due >= 1:
+            self.shots_due -= 1
+            self.fire(signal)
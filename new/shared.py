@@ -1,6 +1,21 @@
+from functools import lru_cache
+
 import ppb
 
+import config
+
 FONT = ppb.Font("Comfortaa_Bold.ttf", size=72)
 TITLE = "Zombie Apocalypse"
+WHITE = (255, 255, 255)
+
+FIRE_DEBOUNCE = 0.1
+
+
+@lru_cache(maxsize=config.Text.cache_size)
+def text(txt, font=FONT, color=WHITE) -> ppb.Text:
+    """
+    Rendered text, shared by everything showing the same string.
 
-FIRE_DEBOUNCE = 0.1
\ No newline at end of file
+    ppb rasterizes every new Text, so repeated strings come from here.
+    """
+    return ppb.Text(txt, font=font, color=color)
@@ -0,0 +1,428 @@
+from __future__ import annotations
+import math
+from collections import defaultdict, deque
+from typing import Any, Callable, Hashable, Iterable, KeysView, Optional, Tuple
+
+import ppb
+
+import config
+
+CellBounds = Tuple[int, int, int, int]
+Box = Tuple[float, float, float, float]
+
+
+def bounding_box(obj) -> Box:
+    return obj.left, obj.bottom, obj.right, obj.top
+
+
+def overlaps(obj, box: Box) -> bool:
+    left, bottom, right, top = box
+    return obj.left < right and obj.right > left and obj.bottom < top and obj.top > bottom
+
+
+def swept_box(obj) -> Box:
+    """
+    The box covering obj on its way from obj.swept_from to obj.position.
+    """
+    start, end = obj.swept_from, obj.position
+    half_width, half_height = obj.width / 2, obj.height / 2
+    return (
+        min(start.x, end.x) - half_width,
+        min(start.y, end.y) - half_height,
+        max(start.x, end.x) + half_width,
+        max(start.y, end.y) + half_height
+    )
+
+
+def segment_intersects_box(start: ppb.Vector, end: ppb.Vector, box: Box) -> bool:
+    """
+    Slab test for the segment start to end against an axis aligned box.
+
+    Touching an edge does not count, matching do_collide.
+    """
+    left, bottom, right, top = box
+    t_enter, t_exit = 0.0, 1.0
+    for origin, delta, low, high in ((start.x, end.x - start.x, left, right), (start.y, end.y - start.y, bottom, top)):
+        if delta == 0:
+            if origin <= low or origin >= high:
+                return False
+            continue
+        t_low = (low - origin) / delta
+        t_high = (high - origin) / delta
+        if t_low > t_high:
+            t_low, t_high = t_high, t_low
+        t_enter = max(t_enter, t_low)
+        t_exit = min(t_exit, t_high)
+        if t_enter >= t_exit:
+            return False
+    return True
+
+
+def swept_hit(mover, target) -> bool:
+    """
+    Whether mover touched target anywhere between mover.swept_from and
+    mover.position. target's box is grown by mover's half size so mover
+    can be treated as a point.
+    """
+    half_width, half_height = mover.width / 2, mover.height / 2
+    box = (target.left - half_width, target.bottom - half_height, target.right + half_width, target.top + half_height)
+    return segment_intersects_box(mover.swept_from, mover.position, box)
+
+
+class SpatialHash:
+    """
+    Uniform grid of buckets keyed on integer cell coordinates.
+
+    Objects are any hashable the box function can measure, by default
+    anything with left, right, top and bottom. Each object is stored in
+    every cell its box touches and only re-bucketed when
+    that range of cells changes.
+
+    Buckets are insertion ordered dicts rather than sets, so queries come
+    back in the same order on every run.
+    """
+
+    def __init__(self, cell_size=config.Collider.cell_size, box: Callable[[Any], Box] = bounding_box):
+        self.cell_size = cell_size
+        self.box = box
+        self.cells = defaultdict(dict)
+        self.bounds = {}
+
+    def __contains__(self, item: Hashable) -> bool:
+        return item in self.bounds
+
+    def __len__(self) -> int:
+        return len(self.bounds)
+
+    def cell_bounds(self, obj, box: Callable[[Any], Box] = None) -> CellBounds:
+        size = self.cell_size
+        left, bottom, right, top = (box or self.box)(obj)
+        return (
+            math.floor(left / size),
+            math.floor(bottom / size),
+            math.floor(right / size),
+            math.floor(top / size)
+        )
+
+    def _cells(self, bounds: CellBounds):
+        left, bottom, right, top = bounds
+        for x in range(left, right + 1):
+            for y in range(bottom, top + 1):
+                yield x, y
+
+    def insert(self, obj):
+        bounds = self.cell_bounds(obj)
+        self.bounds[obj] = bounds
+        for cell in self._cells(bounds):
+            self.cells[cell][obj] = None
+
+    def remove(self, obj):
+        bounds = self.bounds.pop(obj)
+        for cell in self._cells(bounds):
+            bucket = self.cells[cell]
+            del bucket[obj]
+            if not bucket:
+                del self.cells[cell]
+
+    def update(self, obj):
+        bounds = self.cell_bounds(obj)
+        if self.bounds.get(obj) == bounds:
+            return
+        if obj in self.bounds:
+            self.remove(obj)
+        self.insert(obj)
+
+    def sync(self, objects: Iterable):
+        """
+        Make the hash contain exactly the given objects, re-bucketing the ones
+        that moved.
+        """
+        objects = dict.fromkeys(objects)
+        for stale in [obj for obj in self.bounds if obj not in objects]:
+            self.remove(stale)
+        for obj in objects:
+            self.update(obj)
+
+    def query_radius(self, position: ppb.Vector, radius) -> list:
+        """
+        Everything whose cells overlap the square around the circle. Callers
+        do their own exact distance check.
+        """
+        size = self.cell_size
+        found = {}
+        cells = self.cells
+        for x in range(math.floor((position.x - radius) / size), math.floor((position.x + radius) / size) + 1):
+            for y in range(math.floor((position.y - radius) / size), math.floor((position.y + radius) / size) + 1):
+                bucket = cells.get((x, y))
+                if bucket:
+                    found.update(bucket)
+        return list(found)
+
+    def _collect(self, bounds: CellBounds) -> dict:
+        found = {}
+        cells = self.cells
+        for cell in self._cells(bounds):
+            bucket = cells.get(cell)
+            if bucket:
+                found.update(bucket)
+        return found
+
+    def query(self, obj) -> KeysView:
+        """
+        Everything sharing at least one cell with obj's bounding box.
+        """
+        found = self._collect(self.cell_bounds(obj, bounding_box))
+        found.pop(obj, None)
+        return found.keys()
+
+    def query_box(self, box: Box) -> KeysView:
+        """
+        Everything sharing at least one cell with box, as left, bottom,
+        right, top.
+        """
+        return self._collect(self.cell_bounds(box, lambda box: box)).keys()
+
+
+class CellMask:
+    """
+    Set of grid cells covered by square tiles centered on positions.
+    """
+
+    def __init__(self, positions: Iterable[ppb.Vector], size, cell_size=config.Collider.map_cell_size):
+        self.cell_size = cell_size
+        self.cells = set()
+        half = size / 2
+        for position in positions:
+            self.cells.update(self._cells(position.x - half, position.y - half, position.x + half, position.y + half))
+
+    def _cells(self, left, bottom, right, top):
+        size = self.cell_size
+        for x in range(math.floor(left / size), math.ceil(right / size)):
+            for y in range(math.floor(bottom / size), math.ceil(top / size)):
+                yield x, y
+
+    def touches(self, obj) -> bool:
+        cells = self.cells
+        return any(cell in cells for cell in self._cells(obj.left, obj.bottom, obj.right, obj.top))
+
+
+class CollisionMap(CellMask):
+    """
+    Static occupancy grid baked from wall positions.
+
+    Every solid cell stores the direction that points out of the wall mass,
+    so resolving a mobile against the level is a handful of dict lookups.
+    """
+    neighbors = ((0, 1), (1, 0), (0, -1), (-1, 0))
+
+    def __init__(self, walls: Iterable[ppb.Vector], wall_size=config.Collider.wall_size,
+                 cell_size=config.Collider.map_cell_size, push=config.Collider.wall_push):
+        super().__init__(walls, wall_size, cell_size)
+        self.push = push
+        self.solid = self.cells
+
+        self.normals = {}
+        for x, y in self.solid:
+            normal = ppb.Vector(0, 0)
+            for dx, dy in self.neighbors:
+                if (x + dx, y + dy) not in self.solid:
+                    normal += ppb.Vector(dx, dy)
+            self.normals[x, y] = normal.normalize() if normal else normal
+
+    def resolve(self, obj) -> Optional[ppb.Vector]:
+        """
+        None if obj is clear of every wall, otherwise the vector that pushes
+        it back out, along one axis. A mobile buried in a wall is pushed
+        toward the nearest open cell.
+        """
+        normals = self.normals
+        hit = []
+        total = ppb.Vector(0, 0)
+        for cell in self._cells(obj.left, obj.bottom, obj.right, obj.top):
+            normal = normals.get(cell)
+            if normal is not None:
+                hit.append(cell)
+                total += normal
+        if not hit:
+            return None
+        if not total:
+            total = self.way_out(obj.position)
+        elif total.x and total.y:
+            total = self.along_one_axis(obj.position, total, hit)
+        return total.scale_to(self.push) if total else total
+
+    def along_one_axis(self, position: ppb.Vector, total: ppb.Vector, hit) -> ppb.Vector:
+        # On a tie, a lone corner, leave along the axis obj already sticks out on.
+        size = self.cell_size
+        if abs(abs(total.x) - abs(total.y)) < 1e-9:
+            center_x = (sum(x for x, _ in hit) / len(hit) + 0.5) * size
+            center_y = (sum(y for _, y in hit) / len(hit) + 0.5) * size
+            keep_x = abs(position.x - center_x) >= abs(position.y - center_y)
+        else:
+            keep_x = abs(total.x) > abs(total.y)
+        return ppb.Vector(total.x, 0) if keep_x else ppb.Vector(0, total.y)
+
+    def way_out(self, position: ppb.Vector, reach=4) -> ppb.Vector:
+        """
+        Toward the center of the nearest open cell within reach rings, zero
+        if there is none.
+        """
+        size = self.cell_size
+        center_x, center_y = math.floor(position.x / size), math.floor(position.y / size)
+        for ring in range(1, reach + 1):
+            nearest = min(
+                (
+                    ppb.Vector((x + 0.5) * size, (y + 0.5) * size) - position
+                    for x in range(center_x - ring, center_x + ring + 1)
+                    for y in range(center_y - ring, center_y + ring + 1)
+                    if max(abs(x - center_x), abs(y - center_y)) == ring and (x, y) not in self.solid
+                ),
+                key=lambda offset: offset.length,
+                default=None
+            )
+            if nearest is not None:
+                return nearest
+        return ppb.Vector(0, 0)
+
+
+class FlowField:
+    """
+    Directions toward a goal that go around the walls of a CollisionMap.
+
+    A breadth first pass from the goal cell over the open cells within
+    radius of it, and inside limits, stores for every reachable cell the
+    step back toward the goal. Moving the goal only marks the field stale,
+    the pass runs when a chaser first asks for a direction, so nothing is
+    spent while nobody chases. Beyond radius chasers walk straight.
+    """
+    neighbors = ((0, 1), (1, 0), (0, -1), (-1, 0), (1, 1), (1, -1), (-1, -1), (-1, 1))
+    steps = {(dx, dy): ppb.Vector(-dx, -dy).normalize() for dx, dy in neighbors}
+
+    def __init__(self, collision_map: CollisionMap, limits, margin=config.Collider.wall_size,
+                 radius=config.Collider.flow_radius):
+        self.cell_size = collision_map.cell_size
+        self.solid = collision_map.solid
+        self.reach = math.ceil(radius / self.cell_size)
+        top, right, bottom, left = limits
+        self.left, self.bottom = self.cell(ppb.Vector(left - margin, bottom - margin))
+        self.right, self.top = self.cell(ppb.Vector(right + margin, top + margin))
+        self.goal = None
+        self.stale = False
+        self.directions = {}
+
+    def cell(self, position: ppb.Vector) -> Tuple[int, int]:
+        return math.floor(position.x / self.cell_size), math.floor(position.y / self.cell_size)
+
+    def update(self, goal: ppb.Vector) -> bool:
+        """
+        Point the field at goal. True if goal moved to another cell.
+        """
+        goal_cell = self.cell(goal)
+        if goal_cell == self.goal:
+            return False
+        self.goal = goal_cell
+        self.stale = True
+        return True
+
+    def search(self):
+        goal_x, goal_y = goal_cell = self.goal
+        solid = self.solid
+        reach = self.reach
+        left, bottom = max(self.left, goal_x - reach), max(self.bottom, goal_y - reach)
+        right, top = min(self.right, goal_x + reach), min(self.top, goal_y + reach)
+        steps = list(self.steps.items())
+        directions = {goal_cell: None}
+        frontier = deque([goal_cell])
+        while frontier:
+            x, y = frontier.popleft()
+            for (dx, dy), step in steps:
+                cell = x + dx, y + dy
+                if cell in directions or cell in solid:
+                    continue
+                if not (left <= cell[0] <= right and bottom <= cell[1] <= top):
+                    continue
+                # No cutting corners past a wall.
+                if dx and dy and ((x + dx, y) in solid or (x, y + dy) in solid):
+                    continue
+                directions[cell] = step
+                frontier.append(cell)
+        self.directions = directions
+        self.stale = False
+
+    def toward(self, position: ppb.Vector, target: ppb.Vector) -> Optional[ppb.Vector]:
+        """
+        The direction to walk from position to reach target, None when the
+        field can't help: target isn't its goal, position shares the goal
+        cell or no path within radius reaches it.
+        """
+        if self.cell(target) != self.goal:
+            return None
+        if self.stale:
+            self.search()
+        return self.directions.get(self.cell(position))
+
+
+class AlertField:
+    """
+    Coarse grid of fading alerts.
+
+    A cry stamps the target it is chasing into every cell whose center is
+    within radius, enemies without a target read the cell they stand in.
+    Stamps are numbered, so an enemy can skip the ones it already followed,
+    and expire after lifetime seconds of simulation time.
+    """
+
+    def __init__(self, cell_size=config.Alert.cell_size, radius=config.Alert.radius, lifetime=config.Alert.lifetime):
+        self.cell_size = cell_size
+        self.radius = radius
+        self.reach = math.ceil(radius / cell_size)
+        self.lifetime = lifetime
+        self.time = 0
+        self.count = 0
+        self.cells = {}
+        self.stamps = deque()  # (expires, stamp, cells), oldest first.
+
+    def cell(self, position: ppb.Vector) -> Tuple[int, int]:
+        return math.floor(position.x / self.cell_size), math.floor(position.y / self.cell_size)
+
+    def advance(self, time_delta):
+        self.time += time_delta
+        cells = self.cells
+        stamps = self.stamps
+        while stamps and stamps[0][0] <= self.time:
+            _, stamp, stamped = stamps.popleft()
+            for cell in stamped:
+                # Newer stamps may have taken the cell over.
+                if cells[cell][0] == stamp:
+                    del cells[cell]
+
+    def stamp(self, position: ppb.Vector, target: ppb.Vector):
+        center_x, center_y = self.cell(position)
+        size = self.cell_size
+        reach = self.reach
+        limit = self.radius ** 2
+        self.count += 1
+        expires = self.time + self.lifetime
+        alert = (self.count, target, expires)
+        cells = self.cells
+        stamped = []
+        for x in range(center_x - reach, center_x + reach + 1):
+            for y in range(center_y - reach, center_y + reach + 1):
+                if ((x + 0.5) * size - position.x) ** 2 + ((y + 0.5) * size - position.y) ** 2 > limit:
+                    continue
+                cells[x, y] = alert
+                stamped.append((x, y))
+        self.stamps.append((expires, self.count, stamped))
+
+    def sample(self, position: ppb.Vector, after=0) -> Optional[Tuple[int, ppb.Vector]]:
+        """
+        The live alert at position as (stamp, target), None if there is none
+        or it is not newer than stamp number after.
+        """
+        alert = self.cells.get(self.cell(position))
+        if alert is None:
+            return None
+        stamp, target, expires = alert
+        if stamp <= after or self.time >= expires:
+            return None
+        return stamp, target
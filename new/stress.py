@@ -0,0 +1,98 @@
+"""
+Ramp a StressScene and find where the frame budget breaks.
+
+Steps one headless StressScene through increasing zombie counts, timing
+every frame and every event type with the Profiler. Each step prints one JSON
+line; the summary names the first count at which the whole frame, and
+each event type on its own, went over budget on average:
+
+    python stress.py --zombies 100 250 500 1000 --fire-rate 8 --walls 120
+"""
+from __future__ import annotations
+import argparse
+import json
+import os
+from collections import defaultdict
+from statistics import mean
+from typing import Dict, Iterable, Iterator
+
+import config
+import headless
+import profiler
+import scenes
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def ramp(counts: Iterable[int], ticks=config.Stress.ticks, **scene_kwargs) -> Iterator[Dict]:
+    counts = list(counts)
+    with headless.Runner(
+        scene=scenes.StressScene,
+        scene_kwargs=dict(scene_kwargs, zombies=counts[0]),
+        systems=headless.Runner.default_systems + (profiler.Profiler,),
+        profile=True
+    ) as runner:
+        frames = next(child for child in runner.engine.children if isinstance(child, profiler.Profiler)).frames
+        for count in counts:
+            runner.scene.zombies = count
+            runner.run(1)  # Let the population catch up before measuring.
+            frames.clear()
+            runner.run(ticks)
+            events = defaultdict(int)
+            for frame in frames:
+                for name, duration_ns in frame.events.items():
+                    events[name] += duration_ns
+            frame_ms = [frame.duration_ns / 1e6 for frame in frames]
+            runner.scene.sprite_layers()  # Headless never renders, cull once for the counts.
+            yield {
+                "zombies": count,
+                "enemies": runner.scene.count(scenes.enemies.Zombie),
+                "frames": len(frame_ms),
+                "mean_ms": mean(frame_ms),
+                "p95_ms": percentile(frame_ms, 0.95),
+                "max_ms": max(frame_ms),
+                "visible": runner.scene.visible_sprites,
+                "culled": runner.scene.culled_sprites,
+                "events_ms": {
+                    name: total / len(frames) / 1e6
+                    for name, total in sorted(events.items(), key=lambda item: -item[1])
+                },
+            }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ramp the stress scene and report where frames go over budget.")
+    parser.add_argument("--zombies", type=int, nargs="+", default=list(config.Stress.ramp))
+    parser.add_argument("--skeletons", type=int, default=config.Stress.skeletons)
+    parser.add_argument("--walls", type=int, default=config.Stress.walls)
+    parser.add_argument("--hazards", type=int, default=config.Stress.hazards)
+    parser.add_argument("--fire-rate", type=float, default=config.Stress.fire_rate, help="Shots per second.")
+    parser.add_argument("--arena", type=int, default=config.Stress.arena)
+    parser.add_argument("--ticks", type=int, default=config.Stress.ticks, help="Frames measured per step.")
+    parser.add_argument("--budget", type=float, default=config.Stress.budget_ms, help="Frame budget in ms.")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    broken = {}
+    for result in ramp(args.zombies, args.ticks, skeletons=args.skeletons, walls=args.walls, hazards=args.hazards,
+                       fire_rate=args.fire_rate, arena=args.arena, seed=args.seed):
+        print(json.dumps(result), flush=True)
+        if result["mean_ms"] > args.budget:
+            broken.setdefault("frame", result["zombies"])
+        for name, duration_ms in result["events_ms"].items():
+            if duration_ms > args.budget:
+                broken.setdefault(name, result["zombies"])
+
+    if not broken:
+        print(f"Every step stayed within {args.budget} ms.")
+    for name, count in broken.items():
+        print(f"{name} over {args.budget} ms from {count} zombies")
+
+
+if __name__ == "__main__":
+    main()
+    # Asset loading never starts headless, so its waiter threads never finish.
+    os._exit(0)
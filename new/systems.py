@@ -4,22 +4,29 @@ from dataclasses import dataclass
 import ppb
 from ppb import keycodes, systemslib
 
+import config
+import enemies
 import events
-from shared import FONT
+from shared import text
 
 
 class ScoreDisplay(ppb.RectangleSprite):
-    score = 0
     layer = 100
     offset = ppb.Vector(0, 0)
     height = 1.5
+    image = text("Score: 0")
+    _score = 0
 
     @property
-    def image(self):
-        return ppb.Text(f"Score: {self.score}", font=FONT, color=(255, 255, 255))
+    def score(self):
+        return self._score
 
-    def on_pre_render(self, event: ppb.events.PreRender, signal):
-        self.position = event.scene.main_camera.position + self.offset
+    @score.setter
+    def score(self, value):
+        # Only a new score needs a new image.
+        if value != self._score:
+            self._score = value
+            self.image = text(f"Score: {value}")
 
 
 class ScoreSystem(systemslib.System):
@@ -30,8 +37,8 @@ class ScoreSystem(systemslib.System):
     def __enter__(self):
         pass  # load up existing high score if available
 
-    def on_enemy_killed(self, event: events.EnemyKilled, signal):
-        self.current_score += event.enemy.points
+    def on_enemies_killed(self, event: events.EnemiesKilled, signal):
+        self.current_score += sum(enemy.points for enemy in event.enemies)
 
     def on_game_over(self, event: events.GameOver, signal):
         if self.current_score >= self.top_score:
@@ -42,10 +49,7 @@ class ScoreSystem(systemslib.System):
     def on_scene_started(self, event: ppb.events.SceneStarted, signal):
         event.scene.top_score = self.top_score
         event.scene.last_score = self.last_score
-
-    def on_pre_render(self, event, signal):
-        for score_display in event.scene.get(kind=ScoreDisplay):
-            score_display.score = self.current_score
+        event.scene.score = self.current_score
 
 
 class Controller(systemslib.System):
@@ -78,3 +82,117 @@ class Controller(systemslib.System):
             self.move_vector -= ppb.directions.Down
         elif event.key is keycodes.D:
             self.move_vector -= ppb.directions.Right
+
+
+NEAR = 0
+MID = 1
+FAR = 2
+
+
+class EnemyBrains(systemslib.System):
+    """
+    Ticks every enemy behavior tree in one loop with a shared context.
+
+    Enemies have no on_update of their own, so they never see the Update
+    broadcast. Enemies sleeping on a Wait are skipped until it is over.
+    Once every brain has ticked the scene's horde moves them all.
+
+    How often an enemy thinks depends on its distance to the player. Near
+    ones tick every frame, mid range ones skip the player checks they would
+    fail anyway, far ones tick every few frames with the time they missed.
+    Chasing enemies, the ones that heard a shot or a cry, are always near.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.context = enemies.Context(None, None)
+        self.frame = 0
+
+    @staticmethod
+    def tier(enemy, player) -> int:
+        if player is None or enemy.chase_target is not None:
+            return NEAR
+        distance = (player.position - enemy.position).length
+        if distance <= max(enemy.awareness, enemy.attack_range) + config.LevelOfDetail.margin:
+            return NEAR
+        if distance <= config.LevelOfDetail.far_distance:
+            return MID
+        return FAR
+
+    def on_update(self, event: ppb.events.Update, signal):
+        clock = getattr(event.scene, "clock", None)
+        if clock is None:
+            return  # Menus have no clock and no enemies.
+        context = self.context
+        context.event = event
+        context.signal = signal
+        now = clock.now
+        player = event.scene.player
+        interval = config.LevelOfDetail.far_interval
+        longest = interval * event.time_delta
+        self.frame += 1
+        for enemy in list(event.scene.get(kind=enemies.Zombie)):
+            elapsed = enemy.lod_elapsed + event.time_delta
+            tier = self.tier(enemy, player)
+            # Far enemies tick on the frames their spawn phase picks.
+            if tier == FAR and (self.frame + enemy.lod_phase) % interval and elapsed < longest:
+                enemy.lod_elapsed = elapsed
+                continue
+            enemy.lod_elapsed = 0
+            context.time_delta = min(elapsed, longest)
+            context.perceive = tier == NEAR
+            enemy.tick(context, now)
+        # Right after the brains, so this frame's intents move this frame.
+        if event.scene.horde is not None:
+            event.scene.horde.step(event.time_delta)
+
+
+class SimulationTime(systemslib.System):
+    """
+    Drives the clock of the running scene and applies its time_scale.
+
+    Each published Update advances the scene clock. Fast-forward signals
+    extra Idle and Update pairs of Clock.time_step, so every step is the same
+    as at normal speed, collisions included.
+    """
+
+    def __init__(self, engine: ppb.engine.GameEngine, time_scale=None, **kwargs):
+        super().__init__(engine=engine, **kwargs)
+        self.time_scale = time_scale
+        self.debt = 0
+        engine.register(ppb.events.Update, self.advance_clock)
+
+    def advance_clock(self, event):
+        clock = getattr(event.scene, "clock", None)
+        if clock is None:
+            return
+        if clock.time_scale < 1:
+            event.time_delta *= clock.time_scale
+        clock.advance(event.time_delta)
+
+    def on_scene_started(self, event: ppb.events.SceneStarted, signal):
+        clock = getattr(event.scene, "clock", None)
+        if clock is not None and self.time_scale is not None:
+            clock.time_scale = self.time_scale
+
+    def on_idle(self, event: ppb.events.Idle, signal):
+        if getattr(event, "fast_forward", False):
+            return
+        clock = getattr(event.scene, "clock", None)
+        if clock is None or clock.time_scale <= 1:
+            self.debt = 0
+            return
+        time_step = config.Clock.time_step
+        self.debt += event.time_delta * (clock.time_scale - 1)
+        steps = int(self.debt / time_step + 1e-9)
+        if steps >= config.Clock.max_steps:
+            # Too far behind to catch up, drop the rest.
+            steps = config.Clock.max_steps
+            self.debt = 0
+        else:
+            self.debt -= steps * time_step
+        for _ in range(steps):
+            idle = ppb.events.Idle(0)
+            idle.fast_forward = True
+            signal(idle)
+            signal(ppb.events.Update(time_step))
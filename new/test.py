@@ -1,8 +1,32 @@
 
+import json
+from concurrent.futures import Future
+from time import perf_counter
+import misbehave
 import ppb
-from pytest import mark
+from pytest import approx, importorskip, mark
 
+import bench
+import clocks
+import compiler
+import config
 import enemies
+import events
+import headless
+import horde
+import levels
+import players
+import pools
+import profiler
+import projectiles
+import replay
+import scenes
+import shared
+import spatial
+import stress
+import systems
+import terrain
+import timers
 
 
 @mark.parametrize(
@@ -16,3 +40,470 @@ import enemies
 def test_enemy_check_outside_limit(limits, _input, expected):
     result = enemies.Zombie.check_outside_limit(_input, *limits)
     assert result == expected
+
+
+def test_spatial_hash_query_shared_cells():
+    grid = spatial.SpatialHash(cell_size=2)
+    near = ppb.Sprite(position=ppb.Vector(0.5, 0.5))
+    far = ppb.Sprite(position=ppb.Vector(9, 9))
+    probe = ppb.Sprite(position=ppb.Vector(1, 1))
+    grid.sync([near, far])
+    assert grid.query(probe) == {near}
+
+
+def test_spatial_hash_sync_moves_and_drops():
+    grid = spatial.SpatialHash(cell_size=2)
+    mover = ppb.Sprite(position=ppb.Vector(0, 0))
+    gone = ppb.Sprite(position=ppb.Vector(0, 0))
+    grid.sync([mover, gone])
+    mover.position = ppb.Vector(20, 20)
+    grid.sync([mover])
+    assert gone not in grid
+    assert grid.query(ppb.Sprite(position=ppb.Vector(0, 0))) == set()
+    assert grid.query(ppb.Sprite(position=ppb.Vector(20, 20))) == {mover}
+
+
+@mark.parametrize(
+    "position,expected",
+    [
+        (ppb.Vector(0, 1.5), ppb.directions.Up),
+        (ppb.Vector(0, -1.5), ppb.directions.Down),
+        (ppb.Vector(-1.5, 0), ppb.directions.Left),
+        (ppb.Vector(1.5, 0), ppb.directions.Right),
+    ]
+)
+def test_collision_map_pushes_out_of_wall(position, expected):
+    collision_map = spatial.CollisionMap([ppb.Vector(0, 0)], push=1)
+    mobile = ppb.Sprite(position=position, size=1.2)
+    assert collision_map.resolve(mobile) == expected
+
+
+def test_collision_map_pushes_out_of_corners_along_one_axis():
+    collision_map = spatial.CollisionMap([ppb.Vector(0, 0)], push=1)
+    mobile = ppb.Sprite(position=ppb.Vector(1.3, 1.5), size=1.2)
+    assert collision_map.resolve(mobile) == ppb.directions.Up
+
+
+def test_collision_map_digs_buried_mobiles_out():
+    collision_map = spatial.CollisionMap([ppb.Vector(x, y) for x in (-2, 0, 2) for y in (-2, 0, 2)], push=1)
+    mobile = ppb.Sprite(position=ppb.Vector(1.5, 0.5), size=0.5)
+    assert not collision_map.normals[1, 0]  # Buried, no side is open.
+    assert collision_map.resolve(mobile) == ppb.directions.Right
+
+
+def test_collision_map_clear_of_walls():
+    collision_map = spatial.CollisionMap([ppb.Vector(0, 0)])
+    assert collision_map.resolve(ppb.Sprite(position=ppb.Vector(5, 5))) is None
+
+
+def test_flow_field_leads_around_walls():
+    collision_map = spatial.CollisionMap([ppb.Vector(0, y) for y in (-2, 0, 2)])
+    field = spatial.FlowField(collision_map, (6, 6, -6, -6))
+    goal = ppb.Vector(4.5, 0.5)
+    assert field.update(goal)
+    assert not field.update(goal + ppb.Vector(0.2, 0.2))
+    position = ppb.Vector(-1.5, 0.5)
+    for _ in range(20):
+        direction = field.toward(position, goal)
+        if direction is None:
+            break
+        position += ppb.Vector(round(direction.x), round(direction.y))
+        assert field.cell(position) not in collision_map.solid
+    assert field.cell(position) == field.goal
+    assert field.toward(position, ppb.Vector(-4, -4)) is None
+
+
+def test_flow_field_pass_stays_cheap_on_late_levels():
+    field = levels.build(20, seed=1).flow_field
+    assert field.update(ppb.Vector(3.5, 0.5)) and field.stale
+    timings = []
+    for _ in range(3):
+        start = perf_counter()
+        field.search()
+        timings.append(perf_counter() - start)
+    assert len(field.directions) <= (2 * field.reach + 1) ** 2
+    assert min(timings) < 0.02
+
+
+def test_indexed_scene_tracks_player_and_counts():
+    scene = scenes.IndexedScene()
+    player = scene.add(players.Player())
+    zombie = scene.add(enemies.Zombie())
+    scene.add(enemies.Skeleton())
+    assert scene.player is player
+    assert scene.count(enemies.Zombie) == 2
+    assert scene.count(enemies.Skeleton) == 1
+    scene.remove(zombie)
+    scene.remove(player)
+    assert scene.player is None
+    assert scene.count(enemies.Zombie) == 1
+
+
+def test_horde_engine_integrates_intents():
+    importorskip("numpy")
+    engine = horde.HordeEngine(capacity=1)
+    walker = enemies.Zombie(position=ppb.Vector(0, 0))
+    chaser = enemies.Zombie(position=ppb.Vector(0, 0))
+    engine.register(walker)
+    engine.register(chaser)
+    engine.steer(walker, ppb.directions.Right, 2)
+    engine.seek(chaser, ppb.Vector(0, 10), 1)
+    engine.step(0.5)
+    assert walker.position == ppb.Vector(1, 0)
+    assert chaser.position == ppb.Vector(0, 0.5)
+    engine.unregister(walker)
+    engine.step(0.5)
+    assert chaser.position == ppb.Vector(0, 0.5)
+
+
+def test_compiled_tree_matches_interpreted():
+    clock = [0]
+
+    def timer():
+        return clock[0]
+
+    class Actor:
+        armed = False
+        fired = 0
+        blackboard = None
+
+    tree = misbehave.selector.Priority(
+        misbehave.selector.Sequence(
+            misbehave.action.CheckValue("armed"),
+            misbehave.action.SetCurrentTime("start", timer),
+            misbehave.action.Wait("start", 2, timer),
+            misbehave.action.IncreaseValue("fired"),
+            misbehave.action.SetValue("armed", False),
+        ),
+        misbehave.selector.Concurrent(
+            misbehave.decorator.Inverter(misbehave.action.CheckValue("armed")),
+            misbehave.action.SetValue("armed", True),
+        )
+    )
+    executor = compiler.compile_tree(tree, Actor)
+    interpreted, compiled = Actor(), Actor()
+    for tick in range(12):
+        clock[0] = tick
+        assert tree(interpreted, None) == executor(compiled, enemies.Context(None, None))
+        assert (interpreted.armed, interpreted.fired) == (compiled.armed, compiled.fired)
+    assert compiled.fired > 0
+    assert "start" in executor.slots and not hasattr(compiled, "start")
+
+
+def test_exclusive_wait_lets_the_tree_sleep():
+    clock = [0]
+
+    class Actor:
+        blackboard = None
+
+    tree = misbehave.selector.Sequence(
+        misbehave.action.SetCurrentTime("start", lambda: clock[0]),
+        misbehave.action.Wait("start", 2, lambda: clock[0]),
+    )
+    context = enemies.Context(None, None)
+    assert compiler.compile_tree(tree, Actor)(Actor(), context) is misbehave.State.RUNNING
+    assert context.wake_at == 2
+
+    guarded = compiler.compile_tree(misbehave.decorator.Inverter(tree), Actor)
+    context = enemies.Context(None, None)
+    guarded(Actor(), context)
+    assert context.wake_at is None
+
+
+def test_compiled_timers_read_the_scene_clock():
+    class Actor:
+        blackboard = None
+
+    tree = misbehave.selector.Sequence(
+        misbehave.action.SetCurrentTime("start", clocks.now),
+        misbehave.action.Wait("start", 1, clocks.now),
+    )
+    executor = compiler.compile_tree(tree, Actor)
+    scene = scenes.IndexedScene()
+    context = enemies.Context(ppb.events.Update(0.016, scene=scene), None)
+    actor = Actor()
+    assert executor(actor, context) is misbehave.State.RUNNING
+    scene.clock.advance(1)
+    assert executor(actor, context) is misbehave.State.SUCCESS
+
+
+def test_far_enemies_tick_less_often_until_they_hear_a_shot():
+    game = bench.build_game()
+    game.player.position = ppb.Vector(0, 0)
+    far = ppb.Vector(config.LevelOfDetail.far_distance + 5, 0)
+    interval = config.LevelOfDetail.far_interval
+    # Earlier enemies dying every frame must not starve the later ones.
+    doomed = [game.add(enemies.Zombie(position=far)) for _ in range(interval * 2)]
+    zombie = game.add(enemies.Zombie(position=far))
+    deltas = []
+    zombie.tick = lambda context, now: deltas.append(context.time_delta)
+    brains = systems.EnemyBrains()
+    update = ppb.events.Update(0.016, scene=game)
+    for _ in range(interval * 2):
+        brains.on_update(update, bench.ignore_signal)
+        game.remove(doomed.pop(0))
+    assert len(deltas) == 2
+    assert max(deltas) <= interval * 0.016
+    assert sum(deltas) + zombie.lod_elapsed == approx(interval * 2 * 0.016)
+
+    zombie.on_shot_fired(events.ShotFired(ppb.Vector(0, 0), noise=10), None)
+    deltas.clear()
+    brains.on_update(update, bench.ignore_signal)
+    assert deltas
+
+
+def test_sprite_layers_cull_outside_the_camera():
+    game = bench.build_game()
+    far = game.main_camera.width
+    near_wall, far_wall = terrain.Wall(position=ppb.Vector(1, 1)), terrain.Wall(position=ppb.Vector(far, far))
+    near_zombie, far_zombie = enemies.Zombie(position=ppb.Vector(-1, 0)), enemies.Zombie(position=ppb.Vector(-far, 0))
+    for sprite in (near_wall, far_wall, near_zombie, far_zombie):
+        game.add(sprite)
+    layers = list(game.sprite_layers())
+    assert near_wall in layers and near_zombie in layers and game.player in layers
+    assert far_wall not in layers and far_zombie not in layers
+    assert game.visible_sprites == len(layers)
+    assert game.visible_sprites + game.culled_sprites == sum(1 for child in game if hasattr(child, "__image__"))
+
+
+def test_headless_runner_steps_game():
+    with headless.Runner(scene_kwargs={"level": 1}) as runner:
+        report = runner.run(120)
+        assert runner.scene.level_spawned
+    assert report.ticks == 120
+    assert report.scene == "Game"
+
+
+@mark.parametrize("time_scale, steps", [(0.5, 0.5), (1, 1), (10, 10)])
+def test_scene_clock_follows_time_scale(time_scale, steps):
+    with headless.Runner(scene=scenes.Sandbox, time_scale=time_scale) as runner:
+        runner.run(20)
+        assert runner.scene.clock.now == approx(20 * steps * config.Clock.time_step)
+
+
+@mark.parametrize("name", sorted(bench.BENCHMARKS))
+def test_benchmarks_run(name):
+    result = bench.measure(name, 10, repeat=1)
+    assert result["entities"] == 10 and result["min_s"] > 0
+
+
+def test_pool_recycles_reset_instances():
+    pool = pools.Pool(enemies.Zombie)
+    zombie = pool.acquire(position=ppb.Vector(1, 1))
+    zombie.heat = 3
+    zombie.chase_target = ppb.Vector(5, 5)
+    zombie.blackboard = [1, 2]
+    pool.release(zombie)
+    recycled = pool.acquire(position=ppb.Vector(2, 2))
+    assert recycled is zombie
+    assert recycled.position == ppb.Vector(2, 2)
+    assert (recycled.heat, recycled.chase_target, recycled.blackboard) == (0, None, None)
+
+
+def test_scene_releases_pooled_children_on_removal():
+    scene = scenes.IndexedScene()
+    bullet = scene.add(pools.acquire(players.Bullet))
+    scene.remove(bullet)
+    assert pools.acquire(players.Bullet) is bullet
+
+
+@mark.parametrize(
+    "start,end,expected",
+    [
+        (ppb.Vector(-5, 0), ppb.Vector(5, 0), True),
+        (ppb.Vector(-5, 2), ppb.Vector(5, 2), False),
+        (ppb.Vector(-5, -5), ppb.Vector(5, 5), True),
+        (ppb.Vector(0, 0), ppb.Vector(0, 0), True),
+        (ppb.Vector(-5, 0), ppb.Vector(-2, 0), False),
+    ]
+)
+def test_segment_intersects_box(start, end, expected):
+    assert spatial.segment_intersects_box(start, end, (-1, -1, 1, 1)) == expected
+
+
+def test_fast_bullet_cannot_tunnel_through_skeleton():
+    skeleton = enemies.Skeleton(position=ppb.Vector(0, 0))
+    bullet = players.Bullet(position=ppb.Vector(-3, 0), direction=ppb.directions.Right)
+    bullet.position = ppb.Vector(3, 0)
+    assert not scenes.do_collide(skeleton, bullet)
+    assert spatial.swept_hit(bullet, skeleton)
+
+
+def test_projectile_buffer_expires_by_lifetime():
+    buffer = projectiles.ProjectileBuffer(capacity=1)
+    bullet = players.Bullet(position=ppb.Vector(0, 0), direction=ppb.directions.Right, max_distance=3)
+    buffer.register(bullet)
+    for _ in range(4):  # Grows twice past the initial capacity.
+        buffer.register(players.Bullet(position=ppb.Vector(0, 0), max_distance=100))
+    assert buffer.step(0.1) == []
+    assert bullet.position.isclose(ppb.Vector(1.5, 0))
+    assert buffer.step(0.1) == [bullet]
+
+
+def test_shot_listeners_are_limited_to_hearing_range():
+    scene = scenes.IndexedScene()
+    near = scene.add(enemies.Zombie(position=ppb.Vector(5, 0)))
+    skeleton = scene.add(enemies.Skeleton(position=ppb.Vector(0, 7.5)))
+    scene.add(enemies.Zombie(position=ppb.Vector(40, 40)))
+    assert enemies.Zombie.hearing_range(1) == enemies.Skeleton.awareness
+    assert set(scene.listeners(ppb.Vector(0, 0), 1)) == {near, skeleton}
+
+
+def test_alert_field_stamps_nearby_cells_and_fades():
+    field = spatial.AlertField(cell_size=4, radius=8, lifetime=1)
+    target = ppb.Vector(3, 3)
+    field.stamp(ppb.Vector(0, 0), target)
+    stamp, sampled = field.sample(ppb.Vector(6, -1))
+    assert sampled == target
+    assert field.sample(ppb.Vector(6, -1), after=stamp) is None
+    assert field.sample(ppb.Vector(6, -6)) is None  # Corner of the box, outside the radius.
+    assert field.sample(ppb.Vector(30, 0)) is None
+    field.advance(1)
+    assert not field.cells and not field.stamps
+
+
+def test_timer_wheel_cooldowns_are_per_key():
+    wheel = timers.TimerWheel(resolution=0.1, size=4)
+    assert wheel.cooldown(("a", "heat"), 0.2)
+    assert not wheel.cooldown(("a", "heat"), 0.2)
+    assert wheel.cooldown(("b", "heat"), 0.2)
+    wheel.advance(0.25)
+    assert wheel.ready(("a", "heat")) and not wheel
+
+
+def test_timer_wheel_fires_expired_callbacks_in_batch():
+    wheel = timers.TimerWheel(resolution=0.1, size=4)
+    fired = []
+    wheel.arm("short", 0.1, lambda: fired.append("short"))
+    wheel.arm("long", 1, lambda: fired.append("long"))
+    wheel.arm("cancelled", 0.1, lambda: fired.append("cancelled"))
+    wheel.cancel("cancelled")
+    wheel.advance(0.5)
+    assert fired == ["short"]
+    wheel.advance(0.5)
+    assert fired == ["short", "long"]
+
+
+def test_score_display_renders_only_new_scores():
+    display = systems.ScoreDisplay()
+    first = display.image
+    display.score = 0
+    assert display.image is first
+    display.score = 10
+    assert display.image is not first
+    assert display.image is shared.text("Score: 10")
+
+
+def test_hud_updates_on_hurt_and_kills_only():
+    with headless.Runner(scene_kwargs={"level": 1}) as runner:
+        runner.run(1)
+        scene = runner.scene
+        hud = scene.hud
+        scene.hurt_player(runner.engine.signal, 3)
+        runner.engine.signal(events.EnemiesKilled([enemies.Zombie()]))
+        runner.run(1)
+        assert [heart.image is heart.full_image for heart in hud.hearts] == [True] * 7 + [False] * 3
+        assert hud.score_display.score == enemies.Zombie.points
+        camera = scene.main_camera.position
+        assert all(sprite.position == camera + sprite.offset for sprite in hud.sprites)
+
+        scene.player.position = camera + ppb.Vector(1, 0)
+        runner.run(150)
+        assert scene.main_camera.position == scene.player.position
+
+
+def test_hazard_mask_burns_everything_standing_in_fire_at_once():
+    with headless.Runner(scene=scenes.Sandbox) as runner:
+        scene = runner.scene
+        zombie = next(scene.get(kind=enemies.Zombie))
+        assert scene.hazard_mask.touches(zombie)
+        assert not scene.hazard_mask.touches(scene.player)
+        scene.player.position = ppb.Vector(0.5, -0.5)
+        runner.run(2)
+        assert scene.player.heat and zombie.heat
+
+
+def test_collider_batches_kills_and_hits_per_tick():
+    scene = scenes.IndexedScene()
+    collider = scene.add(scenes.Collider(primed=True))
+    player = scene.add(players.Player(position=ppb.Vector(0, 0)))
+    for x in (5, 10):
+        scene.add(enemies.Zombie(position=ppb.Vector(x, 0)))
+        scene.add(players.Bullet(position=ppb.Vector(x, 0), direction=ppb.directions.Up))
+    for _ in range(2):
+        scene.add(enemies.Zombie(position=ppb.Vector(0, 0)))
+    signalled = []
+    collider.on_idle(ppb.events.Idle(0, scene=scene), lambda event, targets=None: signalled.append(event))
+    killed, hurt = signalled
+    assert len(killed.enemies) == 2 and hurt.hits == 2
+
+    score = systems.ScoreSystem()
+    score.on_enemies_killed(killed, None)
+    assert score.current_score == 2 * enemies.Zombie.points
+
+
+def test_next_level_arrives_prepared():
+    with headless.Runner(scene_kwargs={"level": 1}) as runner:
+        first = runner.scene
+        layout = first.next_layout.result()
+        first.next_layout = Future()
+        first.spawned = first.spawn_limit
+        runner.run(2)
+        assert runner.scene is first  # Still being laid out, keep playing.
+        first.next_layout.set_result(layout)
+        runner.run(2)
+        second = runner.scene
+        assert second is not first and second.level == 2 and second.level_spawned
+        assert second.collision_map is layout.collision_map
+        assert second.count(terrain.Wall) == len(layout.walls)
+
+
+def test_recorded_input_replays_identically(tmp_path):
+    path = tmp_path / "run.zrpl"
+    systems_with_recorder = headless.Runner.default_systems + (replay.Recorder,)
+    with headless.Runner(scene_kwargs={"seed": 7}, systems=systems_with_recorder, record=str(path)) as runner:
+        engine = runner.engine
+        live = []
+        # A live engine runs as many Updates per Idle as wall time allows.
+        for frame in range(60):
+            engine.signal(ppb.events.Idle(0.016))
+            if frame == 5:
+                engine.signal(ppb.events.KeyPressed(ppb.keycodes.W, set()))
+            if frame % 10 == 0:
+                engine.signal(ppb.events.ButtonReleased(ppb.buttons.Secondary, ppb.Vector(5, 5)))
+            for _ in range(frame % 4):
+                engine.signal(ppb.events.Update(0.016))
+            engine.signal(ppb.events.PreRender(0.016))
+            runner.drain()
+            live.append(replay.state_hash(runner.scene))
+
+    recording = replay.load(path)
+    assert (recording.seed, recording.ticks) == (7, sum(frame % 4 for frame in range(60)))
+    assert replay.replay(recording) == live
+
+
+def test_profiler_times_handlers_into_a_chrome_trace(tmp_path):
+    path = tmp_path / "trace.json"
+    with headless.Runner(systems=headless.Runner.default_systems + (profiler.Profiler,), profile=str(path)) as runner:
+        runner.run(40)
+        frames = next(child for child in runner.engine.children if isinstance(child, profiler.Profiler)).frames
+        assert len(frames) == 39
+        assert {"Idle", "Update", "PreRender"} <= set(frames[-1].events)
+    trace = json.loads(path.read_text())["traceEvents"]
+    assert {"Idle", "Update", "frame 0"} <= {entry["name"] for entry in trace}
+
+
+def test_profiler_takes_the_engine_kwargs_main_passes(tmp_path):
+    path = tmp_path / "trace.json"
+    systems = headless.Runner.default_systems + (replay.Recorder, profiler.Profiler)
+    with headless.Runner(scenes.TitleScreen, systems=systems, record=None, profile=str(path)) as runner:
+        runner.engine.signal(ppb.events.Idle(0.01))
+        runner.drain()
+    assert "Idle" in {entry["name"] for entry in json.loads(path.read_text())["traceEvents"]}
+
+
+def test_stress_ramp_keeps_population_and_times_frames():
+    results = list(stress.ramp([5, 15], ticks=5, skeletons=2, walls=4, hazards=2, arena=20, seed=3))
+    assert [result["zombies"] for result in results] == [5, 15]
+    assert 15 <= results[-1]["enemies"] <= 17
+    assert results[-1]["frames"] == 5 and "Update" in results[-1]["events_ms"]
@@ -0,0 +1,81 @@
+from __future__ import annotations
+import math
+from typing import Callable, Dict, Hashable, List, Optional
+
+import config
+
+
+class TimerWheel:
+    """
+    Hashed timer wheel driven by simulation time.
+
+    Timers are keyed, usually by (owner, name), so every instance gets its
+    own cooldown. Arming and checking are a dict and a list operation;
+    advance() walks only the buckets the clock passed and runs the callbacks
+    of everything that expired as one batch.
+    """
+
+    def __init__(self, resolution=config.Timers.resolution, size=config.Timers.slots):
+        self.resolution = resolution
+        self.size = size
+        self.buckets: List[list] = [[] for _ in range(size)]
+        self.deadlines: Dict[Hashable, int] = {}
+        self.tick = 0
+        self.time = 0
+
+    def __contains__(self, key) -> bool:
+        return key in self.deadlines
+
+    def __len__(self) -> int:
+        return len(self.deadlines)
+
+    def arm(self, key: Hashable, delay, callback: Optional[Callable[[], None]] = None):
+        """
+        (Re)start the timer key, it expires delay seconds from now.
+        """
+        deadline = self.tick + max(1, math.ceil(delay / self.resolution))
+        self.deadlines[key] = deadline
+        self.buckets[deadline % self.size].append((deadline, key, callback))
+
+    def cancel(self, key: Hashable):
+        # The bucket entry stays behind and is dropped when its slot comes up.
+        self.deadlines.pop(key, None)
+
+    def ready(self, key: Hashable) -> bool:
+        return key not in self.deadlines
+
+    def cooldown(self, key: Hashable, delay) -> bool:
+        """
+        True and arm key if it isn't running, False while it is.
+        """
+        if key in self.deadlines:
+            return False
+        self.arm(key, delay)
+        return True
+
+    def advance(self, time_delta):
+        self.time += time_delta
+        # Nudged so time landing exactly on a tick isn't lost to rounding.
+        target = math.floor(self.time / self.resolution + 1e-9)
+        deadlines = self.deadlines
+        buckets = self.buckets
+        size = self.size
+        fired = []
+        while self.tick < target:
+            self.tick += 1
+            index = self.tick % size
+            bucket = buckets[index]
+            if not bucket:
+                continue
+            pending = []
+            for entry in bucket:
+                deadline, key, callback = entry
+                if deadline > self.tick:
+                    pending.append(entry)
+                elif deadlines.get(key) == deadline:
+                    del deadlines[key]
+                    if callback is not None:
+                        fired.append(callback)
+            buckets[index] = pending
+        for callback in fired:
+            callback()